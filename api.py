@@ -1,53 +1,358 @@
-from fastapi import FastAPI, HTTPException
-from db_utilities import DataBaseManager, News
+import os
+import json
+import time
+import base64
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from db_utilities import DataBaseManager, News, init_engine, dispose_engine, listen_news_updates, on_news_updated
 from logger_config import setup_logger
+from export import EXPORT_FORMATS, iter_csv, iter_ndjson
+from metrics import api_response_counter, api_route_metrics, render_metrics
+from response_cache import ResponseLRUCache
 
 from pydantic import BaseModel
-from typing import Any, Optional
+from typing import Any, List, Optional
+from dotenv import load_dotenv
+
+# api:app можно запустить и напрямую через uvicorn, минуя main.py
+load_dotenv()
+
+NEWS_FIELDS = ('id', 'title', 'time', 'link', 'content', 'created_at', 'source', 'duplicate_of')
+LIST_DEFAULT_FIELDS = ('id', 'title', 'time', 'link', 'created_at', 'source', 'duplicate_of')
+BATCH_MAX_IDS = int(os.getenv('NEWS_BATCH_MAX_IDS', '500'))
 
 class DefaultResponse(BaseModel):
     error: bool
     message: str
     payload: Optional[Any] = None
 
+class NewsBatchRequest(BaseModel):
+    ids: List[int]
+    fields: Optional[List[str]] = None
+
 logger = setup_logger(__name__)
 
-app = FastAPI(title="News Parser API")
+# изменения из других процессов (роль worker) приходят через LISTEN/NOTIFY; пока подписка не восстановлена
+# после разрыва, устаревший ответ живёт не дольше NEWS_CACHE_TTL
+NEWS_CACHE_TTL = int(os.getenv('NEWS_CACHE_TTL', '300'))
+news_cache = ResponseLRUCache(
+    max_bytes=int(float(os.getenv('NEWS_CACHE_MAX_MB', '64')) * 1024 * 1024),
+    ttl=NEWS_CACHE_TTL
+)
+on_news_updated(news_cache.invalidate)
 
-@app.get("/news/{news_id}")
-async def get_news_by_id(news_id: int):
-    logger.info(f"Запрос новости с ID: {news_id}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not await init_engine():
+        logger.error("Ошибка инициализации пула подключений к базе данных")
+    listener = asyncio.create_task(listen_news_updates())
+    try:
+        yield
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        await dispose_engine()
+
+app = FastAPI(title="News Parser API", lifespan=lifespan)
+
+class RequestMetricsMiddleware:
+    # обычный ASGI middleware: без задач и потоков BaseHTTPMiddleware, а время считается
+    # до последнего фрагмента тела, поэтому потоковая выгрузка учитывается целиком
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = None
+        finished = False
+
+        async def send_with_metrics(message):
+            nonlocal status, finished
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finished = True
+                self._record(scope, status, started)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            # исключение или обрыв соединения до конца ответа
+            if not finished:
+                self._record(scope, status or 500, started)
+
+    @staticmethod
+    def _record(scope, status, started):
+        # шаблон маршрута, а не сам путь, иначе каждый news_id станет отдельной серией
+        route = scope.get('route')
+        route_path = route.path if route is not None else 'unmatched'
+
+        api_route_metrics(scope['method'], route_path)[0].observe(time.perf_counter() - started)
+        api_response_counter(scope['method'], route_path, status).inc()
+
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@asynccontextmanager
+async def open_db_manager():
     db_manager = DataBaseManager()
-    
+
+    if not await db_manager.create_connection():
+        logger.error("Ошибка подключения к базе данных")
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
     try:
-        if not await db_manager.create_connection():
-            logger.error("Ошибка подключения к базе данных")
-            raise HTTPException(status_code=500, detail="Database connection failed")
-        
-        news_item = await db_manager.get_news_by_id(news_id)
-        
-        if not news_item:
-            logger.warning(f"Новость с ID {news_id} не найдена")
-            raise HTTPException(status_code=404, detail=f"News with id {news_id} not found")
-        
-        response = {
-            "id": news_item.id,
-            "title": news_item.title,
-            "time": news_item.time.isoformat() if news_item.time else None,
-            "link": news_item.link,
-            "content": news_item.content,
-            "created_at": news_item.created_at.isoformat() if news_item.created_at else None
+        yield db_manager
+    finally:
+        await db_manager.close_connection()
+
+async def get_db_manager():
+    async with open_db_manager() as db_manager:
+        yield db_manager
+
+def get_db_opener():
+    # для маршрутов с кэшем: сессия открывается только при промахе, а не до обработчика
+    return open_db_manager
+
+def serialize_news(news_item, fields=NEWS_FIELDS):
+    response = {}
+    for field in fields:
+        value = getattr(news_item, field)
+        response[field] = value.isoformat() if isinstance(value, datetime) else value
+    return response
+
+def parse_fields(fields, default=LIST_DEFAULT_FIELDS):
+    if not fields:
+        return default
+
+    if isinstance(fields, str):
+        fields = fields.split(',')
+
+    requested = tuple(dict.fromkeys(field.strip() for field in fields if field.strip()))
+    unknown = [field for field in requested if field not in NEWS_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}; allowed: {', '.join(NEWS_FIELDS)}")
+    return requested
+
+def parse_ids(ids):
+    try:
+        return [int(news_id) for news_id in ids.split(',') if news_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+
+async def fetch_news_batch(db_manager, news_ids, fields):
+    if len(news_ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids: {len(news_ids)}; max {BATCH_MAX_IDS}")
+
+    result = await db_manager.get_news_by_ids(news_ids, fields=fields)
+    if result is None:
+        raise HTTPException(status_code=500, detail="Database query failed")
+
+    rows, missing = result
+    if missing:
+        logger.info("Не найдены новости с ID: %s", missing)
+
+    return {
+        "items": [serialize_news(row, fields) for row in rows],
+        "missing": missing
+    }
+
+def encode_cursor(cursor):
+    sort_key, news_id = cursor
+    sort_key = sort_key.isoformat() if isinstance(sort_key, datetime) else repr(sort_key)
+    return base64.urlsafe_b64encode(f"{sort_key}|{news_id}".encode()).decode()
+
+def decode_cursor(cursor, sort_key_type=datetime.fromisoformat):
+    try:
+        sort_key, news_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return sort_key_type(sort_key), int(news_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/news")
+async def list_news(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, description="Новости начиная с этого момента (включительно)"),
+    date_to: Optional[datetime] = Query(None, description="Новости до этого момента (не включительно)"),
+    fields: Optional[str] = Query(None, description="Список полей через запятую, по умолчанию все, кроме content"),
+    ids: Optional[str] = Query(None, description="Список ID через запятую: вернуть эти новости в том же порядке"),
+    source: Optional[str] = Query(None, description="Только новости этого источника"),
+    db_manager: DataBaseManager = Depends(get_db_manager)
+):
+    selected_fields = parse_fields(fields)
+    decoded_cursor = decode_cursor(cursor) if cursor else None
+
+    try:
+        if ids is not None:
+            return await fetch_news_batch(db_manager, parse_ids(ids), selected_fields)
+
+        result = await db_manager.list_news(
+            limit=limit,
+            cursor=decoded_cursor,
+            date_from=date_from,
+            date_to=date_to,
+            fields=selected_fields,
+            source=source
+        )
+
+        if result is None:
+            raise HTTPException(status_code=500, detail="Database query failed")
+
+        rows, next_cursor = result
+        return {
+            "items": [serialize_news(row, selected_fields) for row in rows],
+            "next_cursor": encode_cursor(next_cursor) if next_cursor else None
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Ошибка при получении списка новостей: %s", e)
+        return DefaultResponse(
+            error=True,
+            message="Ошибка сервера",
+            payload=None
+        )
+
+@app.post("/news/batch")
+async def get_news_batch(request: NewsBatchRequest, db_manager: DataBaseManager = Depends(get_db_manager)):
+    selected_fields = parse_fields(request.fields, default=NEWS_FIELDS)
+
+    try:
+        return await fetch_news_batch(db_manager, request.ids, selected_fields)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Ошибка при получении новостей по списку ID: %s", e)
+        return DefaultResponse(
+            error=True,
+            message="Ошибка сервера",
+            payload=None
+        )
+
+@app.get("/news/export")
+async def export_news(
+    format: str = Query('ndjson', description=f"Формат выгрузки: {', '.join(EXPORT_FORMATS)}"),
+    since: Optional[datetime] = Query(None, description="Только новости с created_at позже этого момента"),
+    fields: Optional[str] = Query(None, description="Список полей через запятую, по умолчанию все"),
+    open_db=Depends(get_db_opener)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}; allowed: {', '.join(EXPORT_FORMATS)}")
+
+    selected_fields = parse_fields(fields) if fields else NEWS_FIELDS
+
+    # подключение открывается до отправки статуса, чтобы недоступная база давала 500, а не пустую выгрузку;
+    # сессия живёт столько же, сколько поток ответа
+    session_scope = AsyncExitStack()
+    db_manager = await session_scope.enter_async_context(open_db())
+
+    async def stream_rows():
+        try:
+            async for row in db_manager.stream_news(since=since, fields=selected_fields):
+                yield row
+        finally:
+            await session_scope.aclose()
+
+    if format == 'csv':
+        body, media_type = iter_csv(stream_rows(), selected_fields), 'text/csv; charset=utf-8'
+    else:
+        body, media_type = iter_ndjson(stream_rows(), selected_fields), 'application/x-ndjson'
+
+    logger.info("Выгрузка новостей в формате %s, since=%s", format, since)
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="news.{format}"'},
+        # при отключении клиента генератор прерывается, и сессию закрывает фоновая задача
+        background=BackgroundTask(session_scope.aclose)
+    )
+
+@app.get("/news/search")
+async def search_news(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db_manager: DataBaseManager = Depends(get_db_manager)
+):
+    decoded_cursor = decode_cursor(cursor, float) if cursor else None
+
+    try:
+        result = await db_manager.search_news(q, limit=limit, cursor=decoded_cursor)
+
+        if result is None:
+            raise HTTPException(status_code=500, detail="Database query failed")
+
+        rows, next_cursor = result
+        return {
+            "items": [serialize_news(row, LIST_DEFAULT_FIELDS + ('rank', 'snippet')) for row in rows],
+            "next_cursor": encode_cursor(next_cursor) if next_cursor else None
         }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Ошибка полнотекстового поиска по запросу %r: %s", q, e)
+        return DefaultResponse(
+            error=True,
+            message="Ошибка сервера",
+            payload=None
+        )
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+@app.get("/news/{news_id}")
+async def get_news_by_id(news_id: int, request: Request, open_db=Depends(get_db_opener)):
+    logger.debug("Запрос новости с ID: %s", news_id)
+    
+    try:
+        cached = news_cache.get(news_id)
+
+        if cached is None:
+            async with open_db() as db_manager:
+                news_item = await db_manager.get_news_by_id(news_id)
+            
+            if not news_item:
+                logger.warning("Новость с ID %s не найдена", news_id)
+                raise HTTPException(status_code=404, detail=f"News with id {news_id} not found")
+            
+            body = json.dumps(serialize_news(news_item), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            cached = news_cache.put(news_id, body)
+
+        headers = {'ETag': cached.etag, 'Cache-Control': f'public, max-age={NEWS_CACHE_TTL}'}
+
+        if etag_matches(request.headers.get('If-None-Match'), cached.etag):
+            return Response(status_code=304, headers=headers)
         
-        logger.info(f"Успешно возвращена новость с ID: {news_id}")
-        return response
+        logger.debug("Успешно возвращена новость с ID: %s", news_id)
+        return Response(content=cached.body, media_type='application/json', headers=headers)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Ошибка при получении новости {news_id}: {e}")
+        logger.error("Ошибка при получении новости %s: %s", news_id, e)
         return DefaultResponse(
-            error=True
-            message="Ошибка сервера"
+            error=True,
+            message="Ошибка сервера",
             payload=None
         )
-    finally:
-        await db_manager.close_connection()
@@ -0,0 +1,80 @@
+import os
+import json
+from datetime import datetime
+
+from db_utilities import find_existing_links
+from parser import NewsParser
+from pipeline import IngestPipeline
+from sources import get_source
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y")
+
+def parse_cli_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Неверный формат даты: {value} (ожидается ГГГГ-ММ-ДД или ДД.ММ.ГГГГ)")
+
+class BackfillCheckpoint:
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self.completed
+
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.completed = set(json.load(f).get('completed_dates', []))
+        except (OSError, ValueError) as e:
+            logger.error("Не удалось прочитать checkpoint %s: %s", self.path, e)
+
+        return self.completed
+
+    def mark_done(self, date_str):
+        self.completed.add(date_str)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'completed_dates': sorted(self.completed)}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+async def run_backfill_async(date_from, date_to, update_existing=False, replay=False, source=None):
+    if date_from > date_to:
+        date_from, date_to = date_to, date_from
+
+    workers = int(os.getenv('BACKFILL_WORKERS', '4'))
+    rate_limit = float(os.getenv('BACKFILL_RATE_LIMIT', '5'))
+    source = get_source(source)
+    # у каждого источника свой список обработанных дат
+    checkpoint = BackfillCheckpoint(os.getenv('BACKFILL_CHECKPOINT', f'backfill_checkpoint_{source.name}.json'))
+    completed = checkpoint.load()
+
+    parser = NewsParser(source=source, rate_limit=rate_limit, replay=replay or None)
+    dates = [date_str for date_str in parser.get_date_range(date_from, date_to) if date_str not in completed]
+
+    logger.info("Загрузка архива %s с %s по %s: %s дней к обработке, %s уже в checkpoint", source.name, date_from, date_to, len(dates), len(completed))
+
+    # при --refresh известные статьи нужно скачать заново, иначе их можно пропустить
+    existing_links_lookup = None if update_existing else find_existing_links
+    pipeline = IngestPipeline.from_env(
+        parser,
+        existing_links_lookup=existing_links_lookup,
+        update_existing=update_existing,
+        on_date_done=checkpoint.mark_done,
+        listing_workers=workers,
+        fetch_workers=source.concurrency
+    )
+    try:
+        totals = await pipeline.run(dates, only_recent=False)
+    finally:
+        await parser.close()
+
+    logger.info("Загрузка архива завершена: добавлено %s, обновлено %s, пропущено %s, ошибок %s", totals['inserted'], totals['updated'], totals['skipped'], totals['failed'])
+    return totals
@@ -0,0 +1,503 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+from http_cache import ResponseCache
+from logger_config import setup_logger
+from parser import NewsParser
+from pipeline import IngestPipeline
+from sources import NewsSource, register_source
+
+logger = setup_logger(__name__)
+
+STAGES = ('listing', 'article_fetch', 'parse', 'db_write')
+
+WORDS = (
+    'губернатор', 'область', 'заявил', 'проект', 'бюджет', 'депутаты', 'региона', 'город', 'строительство',
+    'администрация', 'решение', 'заседание', 'миллионов', 'рублей', 'жители', 'программа', 'развития',
+    'предприятие', 'министерство', 'сообщили', 'году', 'работы', 'дороги', 'школы', 'выборы', 'совет',
+    'мэр', 'комиссия', 'инвестиции', 'промышленность', 'Екатеринбург', 'Тюмень', 'Челябинск', 'Курган',
+)
+
+class FixtureSite:
+    def __init__(self, articles_per_day=50, article_paragraphs=12, latency=0.05, jitter=0.02,
+                 recorded_article=None, seed=1):
+        self.articles_per_day = articles_per_day
+        self.article_paragraphs = article_paragraphs
+        self.latency = latency
+        self.jitter = jitter
+        self.recorded_article = recorded_article
+        self.seed = seed
+        self._random = random.Random(seed)
+
+    def listing_html(self, date_str):
+        items = ''.join(
+            f'<article class="news-article"><a class="news-article__title" href="/news/{date_str}/{index}">'
+            f'Новость {index} за {date_str}</a><time>{index % 24:02d}:{index % 60:02d}</time></article>'
+            for index in range(self.articles_per_day)
+        )
+        return f'<html><body><main>{items}</main></body></html>'
+
+    def article_html(self, date_str, index):
+        # уникальный абзац, чтобы статьи не склеивались дедупликацией по содержимому
+        unique = f'<p>Материал {index} за {date_str}.</p>'
+
+        if self.recorded_article:
+            return self.recorded_article.replace('itemprop="articleBody">', f'itemprop="articleBody">{unique}', 1)
+
+        rng = random.Random(f"{self.seed}-{date_str}-{index}")
+        paragraphs = []
+        for number in range(self.article_paragraphs):
+            words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 80)))
+            if number % 3 == 0:
+                words += f' <a href="/news/related/{number}">по теме</a> продолжение'
+            if number % 4 == 0:
+                words = f'<strong>{rng.choice(WORDS)}</strong> {words}'
+            paragraphs.append(f'<p>{words}</p>')
+
+        return (
+            '<html><head><title>Новость</title><script>var counter = 1;</script></head><body>'
+            f'<div class="article"><div itemprop="articleBody">{unique}{"".join(paragraphs)}'
+            '<div><span>Фото: пресс-служба</span></div></div></div></body></html>'
+        )
+
+    async def _delay(self):
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def handle_listing(self, request):
+        await self._delay()
+        return web.Response(text=self.listing_html(request.query.get('date', '')), content_type='text/html')
+
+    async def handle_article(self, request):
+        await self._delay()
+        date_str, index = request.match_info['date'], int(request.match_info['index'])
+        return web.Response(text=self.article_html(date_str, index), content_type='text/html')
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/news/urfo', self.handle_listing)
+        app.router.add_get('/news/{date}/{index}', self.handle_article)
+        return app
+
+# фикстурный сайт и API запускаются в отдельных процессах, чтобы не делить с краулером event loop и CPU
+def _serve_fixture_site(port, options):
+    web.run_app(FixtureSite(**options).make_app(), host='127.0.0.1', port=port, print=None, access_log=None)
+
+def _serve_api(port, use_db, memory_rows):
+    import uvicorn
+    from api import app, get_db_opener
+
+    if not use_db:
+        rows = {row.id: row for row in _memory_news(memory_rows)}
+
+        class MemoryNewsManager:
+            async def get_news_by_id(self, news_id):
+                return rows.get(news_id)
+
+        @asynccontextmanager
+        async def open_memory_db_manager():
+            yield MemoryNewsManager()
+
+        app.dependency_overrides[get_db_opener] = lambda: open_memory_db_manager
+
+    uvicorn.run(app, host='127.0.0.1', port=port, log_config=None, access_log=False,
+                lifespan='on' if use_db else 'off')
+
+def _memory_news(count):
+    created_at = datetime.now()
+    return [
+        SimpleNamespace(
+            id=news_id, title=f'Новость {news_id}', time=created_at, link=f'http://127.0.0.1/news/{news_id}',
+            content=f'Текст новости {news_id}. ' * 200, created_at=created_at,
+            source='benchmark', duplicate_of=None
+        )
+        for news_id in range(1, count + 1)
+    ]
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _start_process(target, *args):
+    process = multiprocessing.get_context('spawn').Process(target=target, args=args, daemon=True)
+    process.start()
+    return process
+
+async def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Сервер на порту {port} не запустился за {timeout} с")
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3) if samples else None,
+        'p99_ms': round(percentile(samples, 99) * 1000, 3) if samples else None,
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else None,
+    }
+
+def resource_usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss в Linux в килобайтах
+    return {
+        'cpu_seconds': own.ru_utime + own.ru_stime,
+        'children_cpu_seconds': children.ru_utime + children.ru_stime,
+        'peak_rss_mb': own.ru_maxrss / 1024,
+        'children_peak_rss_mb': children.ru_maxrss / 1024,
+    }
+
+class TimedParser(NewsParser):
+    def __init__(self, samples, **kwargs):
+        super().__init__(**kwargs)
+        self.samples = samples
+
+    async def fetch_news_metadata(self, date_str, only_recent=True, source=None):
+        started = time.perf_counter()
+        try:
+            return await super().fetch_news_metadata(date_str, only_recent=only_recent, source=source)
+        finally:
+            self.samples['listing'].append(time.perf_counter() - started)
+
+    async def fetch_article(self, link):
+        started = time.perf_counter()
+        try:
+            return await super().fetch_article(link)
+        finally:
+            self.samples['article_fetch'].append(time.perf_counter() - started)
+
+    async def parse_fetched_content(self, link, body, encoding, entry=None, source=None):
+        started = time.perf_counter()
+        try:
+            return await super().parse_fetched_content(link, body, encoding, entry, source=source)
+        finally:
+            self.samples['parse'].append(time.perf_counter() - started)
+
+def timed_store(store, samples):
+    async def store_batch(news_dict, update_existing=False):
+        started = time.perf_counter()
+        try:
+            return await store(news_dict, update_existing=update_existing)
+        finally:
+            samples['db_write'].append(time.perf_counter() - started)
+    return store_batch
+
+async def memory_store(news_dict, update_existing=False):
+    return {'inserted': len(news_dict), 'updated': 0, 'skipped': 0, 'failed': 0}
+
+async def prepare_database(db_name):
+    from db_utilities import DataBaseManager
+
+    configured = os.getenv('DB_NAME', 'news_db')
+    if db_name == configured:
+        raise RuntimeError(f"Бенчмарк очищает таблицу news, нельзя запускать его на рабочей базе {configured}")
+
+    os.environ['DB_NAME'] = db_name
+    db_manager = DataBaseManager()
+    try:
+        if not await db_manager.create_connection():
+            raise RuntimeError(f"Не удалось подключиться к базе {db_name}, создайте её заранее")
+        await db_manager.clear_database()
+    finally:
+        await db_manager.close_connection()
+
+async def run_crawl_benchmark(args):
+    port = _free_port()
+    recorded_article = None
+    if args.recorded_article:
+        with open(args.recorded_article, encoding='utf-8') as f:
+            recorded_article = f.read()
+
+    site_options = {
+        'articles_per_day': args.articles_per_day,
+        'article_paragraphs': args.article_paragraphs,
+        'latency': args.latency_ms / 1000,
+        'jitter': args.jitter_ms / 1000,
+        'recorded_article': recorded_article,
+        'seed': args.seed,
+    }
+    site = _start_process(_serve_fixture_site, port, site_options)
+
+    store = memory_store
+    if args.db:
+        from db_utilities import store_news
+        store = store_news
+
+    source = register_source(NewsSource(
+        'benchmark', f'http://127.0.0.1:{port}/news/urfo?date={{date}}', concurrency=args.fetch_workers
+    ))
+    samples = {stage: [] for stage in STAGES}
+
+    try:
+        await _wait_for_port(port)
+
+        parser = TimedParser(
+            samples,
+            source=source,
+            cache=ResponseCache(),
+            replay=False,
+            backend=args.backend,
+            parse_workers=args.parse_workers
+        )
+        pipeline = IngestPipeline.from_env(
+            parser,
+            fetch_workers=args.fetch_workers,
+            batch_size=args.batch_size,
+            store=timed_store(store, samples)
+        )
+        date_to = date.today()
+        dates = parser.get_date_range(date_to - timedelta(days=args.days - 1), date_to)
+        await parser.warm_up()
+
+        before = resource_usage()
+        started = time.perf_counter()
+        try:
+            counts = await pipeline.run(dates, only_recent=False)
+        finally:
+            # пул разбора закрывается до замера, иначе CPU дочерних процессов не попадёт в RUSAGE_CHILDREN
+            await parser.close()
+        elapsed = time.perf_counter() - started
+        after = resource_usage()
+    finally:
+        site.terminate()
+        site.join()
+
+    articles = len(samples['parse'])
+    return {
+        'articles': articles,
+        'elapsed_seconds': round(elapsed, 3),
+        'articles_per_second': round(articles / elapsed, 2) if elapsed else None,
+        'counts': counts,
+        'stages': {stage: summarize(stage_samples) for stage, stage_samples in samples.items()},
+        'cpu_seconds': round(after['cpu_seconds'] - before['cpu_seconds'], 3),
+        'parse_workers_cpu_seconds': round(after['children_cpu_seconds'] - before['children_cpu_seconds'], 3),
+        'peak_rss_mb': round(after['peak_rss_mb'], 1),
+        'parse_workers_peak_rss_mb': round(after['children_peak_rss_mb'], 1),
+    }
+
+async def _existing_news_ids(limit):
+    from db_utilities import DataBaseManager
+
+    db_manager = DataBaseManager()
+    try:
+        if not await db_manager.create_connection():
+            return []
+        result = await db_manager.list_news(limit=limit, fields=('id',))
+        return [row.id for row in result[0]] if result else []
+    finally:
+        await db_manager.close_connection()
+
+async def run_api_benchmark(args):
+    news_ids = await _existing_news_ids(args.api_ids) if args.db else list(range(1, args.api_ids + 1))
+    if not news_ids:
+        raise RuntimeError("В базе нет новостей для нагрузки на /news/{news_id}")
+
+    port = _free_port()
+    server = _start_process(_serve_api, port, args.db, args.api_ids)
+    rng = random.Random(args.seed)
+    request_ids = [rng.choice(news_ids) for _ in range(args.api_requests)]
+    latencies = []
+    statuses = {}
+
+    async def worker(session, queue):
+        while queue:
+            news_id = queue.pop()
+            started = time.perf_counter()
+            async with session.get(f'http://127.0.0.1:{port}/news/{news_id}') as response:
+                await response.read()
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    try:
+        await _wait_for_port(port)
+        connector = aiohttp.TCPConnector(limit=args.api_concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(session, request_ids) for _ in range(args.api_concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.join()
+
+    return {
+        'requests': len(latencies),
+        'concurrency': args.api_concurrency,
+        'distinct_ids': len(news_ids),
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency': summarize(latencies),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+# тяжёлые зависимости, которые разовым командам импортировать не нужно
+HEAVY_MODULES = ('fastapi', 'pydantic', 'uvicorn', 'starlette', 'aiohttp', 'bs4', 'lxml', 'pyarrow')
+
+def _import_times(stderr):
+    # строки -X importtime: "import time: self [us] | cumulative | imported package"
+    total_us, modules = 0, set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        modules.add(name.strip().split('.')[0])
+    return total_us, modules
+
+async def _run_main(argv, env, importtime=False):
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), MAIN_SCRIPT, *argv]
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *command, env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    return time.perf_counter() - started, process.returncode, stderr.decode('utf-8', 'replace')
+
+async def run_startup_benchmark(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        # база на закрытом порту и пустой кэш в режиме replay: команда проходит импорт и запуск,
+        # но не ходит ни в сеть, ни в настоящую базу
+        env = dict(
+            os.environ, DB_HOST='127.0.0.1', DB_PORT=str(_free_port()), HTTP_CACHE_DIR=workdir,
+            HTTP_CACHE_REPLAY='1', PARSER_WORKERS='0', LOG_LEVEL='WARNING'
+        )
+        commands = {
+            'help': ['--help'],
+            'clear': ['clear'],
+            'export': ['export', os.path.join(workdir, 'export'), '--format', 'ndjson'],
+            'crawl': ['crawl'],
+        }
+
+        results = {}
+        for name, argv in commands.items():
+            samples = []
+            for _ in range(args.startup_repeats):
+                elapsed, returncode, _ = await _run_main(argv, env)
+                samples.append(elapsed)
+
+            _, _, stderr = await _run_main(argv, env, importtime=True)
+            import_us, modules = _import_times(stderr)
+            results[name] = {
+                'wall': summarize(samples),
+                'exit_code': returncode,
+                'import_ms': round(import_us / 1000, 1),
+                'modules': len(modules),
+                'heavy_modules': sorted(module for module in HEAVY_MODULES if module in modules),
+            }
+        return results
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Офлайн-бенчмарк цепочки скачивание-разбор-запись и API")
+    arg_parser.add_argument("--days", type=int, default=3, help="сколько дат архива обойти")
+    arg_parser.add_argument("--articles-per-day", type=int, default=100)
+    arg_parser.add_argument("--article-paragraphs", type=int, default=12, help="размер синтетической статьи")
+    arg_parser.add_argument("--recorded-article", metavar="FILE",
+                            help="сохранённая HTML-страница статьи вместо синтетической")
+    arg_parser.add_argument("--latency-ms", type=float, default=50, help="задержка ответа фикстурного сайта")
+    arg_parser.add_argument("--jitter-ms", type=float, default=20)
+    arg_parser.add_argument("--backend", default=None, help="PARSER_BACKEND для разбора")
+    arg_parser.add_argument("--parse-workers", type=int, default=int(os.getenv('PARSER_WORKERS', '2')))
+    arg_parser.add_argument("--fetch-workers", type=int, default=20)
+    arg_parser.add_argument("--batch-size", type=int, default=100)
+    # запись идёт через ON CONFLICT ... RETURNING xmax, tsvector и массивы Postgres,
+    # поэтому SQLite не годится даже как замена: замер был бы не того кода, что работает в проде
+    arg_parser.add_argument("--db", action="store_true",
+                            help="писать в Postgres (база --db-name будет очищена), иначе запись в память")
+    arg_parser.add_argument("--db-name", default=os.getenv('BENCHMARK_DB_NAME', 'news_benchmark'))
+    arg_parser.add_argument("--api-requests", type=int, default=2000)
+    arg_parser.add_argument("--api-concurrency", type=int, default=50)
+    arg_parser.add_argument("--api-ids", type=int, default=200, help="сколько разных новостей запрашивать")
+    arg_parser.add_argument("--skip-crawl", action="store_true")
+    arg_parser.add_argument("--skip-api", action="store_true")
+    arg_parser.add_argument("--skip-startup", action="store_true")
+    arg_parser.add_argument("--startup-repeats", type=int, default=5, help="запусков main.py на каждую команду")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--output", metavar="FILE", help="куда записать JSON, по умолчанию stdout")
+    return arg_parser.parse_args(argv)
+
+async def main_async(args):
+    results = {
+        'commit': _git_commit(),
+        'started_at': datetime.now().isoformat(),
+        'config': vars(args),
+    }
+
+    if args.db:
+        await prepare_database(args.db_name)
+
+    try:
+        if not args.skip_crawl:
+            logger.info("Бенчмарк сбора новостей...")
+            results['crawl'] = await run_crawl_benchmark(args)
+
+        if not args.skip_api:
+            logger.info("Бенчмарк API...")
+            results['api'] = await run_api_benchmark(args)
+
+        if not args.skip_startup:
+            logger.info("Бенчмарк времени запуска команд...")
+            results['startup'] = await run_startup_benchmark(args)
+    finally:
+        if args.db:
+            from db_utilities import dispose_engine
+            await dispose_engine()
+
+    return results
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    results = asyncio.run(main_async(args))
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        logger.info("Результаты записаны в %s", args.output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
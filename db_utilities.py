@@ -1,17 +1,83 @@
 import os
-from sqlalchemy import Column, Integer, String, DateTime, Text, text
+import time
+import asyncio
+from sqlalchemy import Column, Computed, Integer, BigInteger, String, DateTime, Text, LargeBinary, Index, ForeignKey, text, tuple_
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred, undefer
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select
-from datetime import datetime
-from dotenv import load_dotenv
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import select, func, or_, literal_column, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, insert as pg_insert
+from datetime import datetime, timedelta
 
+from dedup import DuplicateIndex, fingerprint, near_duplicate_distance, near_duplicate_window
 from logger_config import setup_logger
+from metrics import DB_POOL_CHECKOUT_SECONDS, DB_WRITE_SECONDS, record_article_counts
+from raw_html import decompress_body
 
 logger = setup_logger(__name__)
 
-load_dotenv()
+SEARCH_CONFIG = 'russian'
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')"
+)
+# вычисляемая колонка пересчитывается самим INSERT и ON CONFLICT DO UPDATE, без второй записи строки
+SEARCH_VECTOR_COLUMN = f"search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+
+# create_all не меняет существующие таблицы, поэтому новые колонки добавляются здесь.
+# ALTER TABLE берёт эксклюзивную блокировку даже с IF NOT EXISTS, поэтому выполняется только для отсутствующих колонок
+COLUMN_UPGRADES = (
+    ('search_vector', f"ALTER TABLE news ADD COLUMN IF NOT EXISTS {SEARCH_VECTOR_COLUMN}"),
+    ('source', "ALTER TABLE news ADD COLUMN IF NOT EXISTS source varchar(64)"),
+    ('content_hash', "ALTER TABLE news ADD COLUMN IF NOT EXISTS content_hash varchar(40)"),
+    ('simhash', "ALTER TABLE news ADD COLUMN IF NOT EXISTS simhash bigint"),
+    ('duplicate_of', "ALTER TABLE news ADD COLUMN IF NOT EXISTS duplicate_of integer REFERENCES news(id) ON DELETE SET NULL"),
+)
+
+# разовые заполнения старых строк: идут после транзакции схемы диапазонами id,
+# чтобы не держать блокировку на всю таблицу, и отмечаются в schema_migrations
+DATA_BACKFILLS = (
+    # до появления нескольких источников все новости собирались с uralpolit.ru
+    ('news_source_uralpolit', "UPDATE news SET source = 'uralpolit' "
+                              "WHERE id > :start AND id <= :end AND source IS NULL"),
+)
+
+# коды pg_attribute.attcompression
+COMPRESSION_CODES = {'pglz': 'p', 'lz4': 'l'}
+
+def _apply_storage_settings(sync_conn):
+    # каждая настройка сначала сверяется с каталогом: ALTER TABLE блокирует таблицу, даже если ничего не меняет
+
+    # сжатый HTML уже не ужимается, поэтому хранится вне строки без повторного сжатия
+    raw_storage = sync_conn.execute(text(
+        "SELECT attstorage::text FROM pg_attribute WHERE attrelid = 'news_raw_html'::regclass AND attname = 'body'"
+    )).scalar()
+    if raw_storage != 'e':
+        sync_conn.execute(text("ALTER TABLE news_raw_html ALTER COLUMN body SET STORAGE EXTERNAL"))
+
+    # lz4 есть только с PostgreSQL 14 и только в сборках с его поддержкой, иначе остаётся pglz
+    compression = os.getenv('DB_CONTENT_COMPRESSION', 'lz4')
+    server_version = int(sync_conn.execute(text("SHOW server_version_num")).scalar())
+    supported = compression and server_version >= 140000 and sync_conn.execute(text(
+        "SELECT :compression = ANY(enumvals) FROM pg_settings WHERE name = 'default_toast_compression'"
+    ), {'compression': compression}).scalar()
+    if supported:
+        current = sync_conn.execute(text(
+            "SELECT attcompression::text FROM pg_attribute WHERE attrelid = 'news'::regclass AND attname = 'content'"
+        )).scalar()
+        if current != COMPRESSION_CODES.get(compression):
+            sync_conn.execute(text(f"ALTER TABLE news ALTER COLUMN content SET COMPRESSION {compression}"))
+    elif compression:
+        logger.warning("Сжатие %s для news.content не поддерживается сервером, остаётся pglz", compression)
+
+    # чем меньше порог, тем раньше текст уходит в TOAST и тем плотнее строки метаданных в основной таблице
+    toast_tuple_target = int(os.getenv('DB_TOAST_TUPLE_TARGET', '256'))
+    if toast_tuple_target:
+        reloptions = sync_conn.execute(text("SELECT reloptions FROM pg_class WHERE oid = 'news'::regclass")).scalar()
+        if f"toast_tuple_target={toast_tuple_target}" not in (reloptions or ()):
+            sync_conn.execute(text(f"ALTER TABLE news SET (toast_tuple_target = {toast_tuple_target})"))
 
 Base = declarative_base()
 
@@ -22,8 +88,299 @@ class News(Base):
     title = Column(Text, nullable=False)
     time = Column(DateTime, nullable=False)
     link = Column(String(500), unique=True, nullable=False)
-    content = Column(Text)
+    # текст нужен только карточке новости и выгрузке, метаданные читаются без него
+    content = deferred(Column(Text))
     created_at = Column(DateTime, default=datetime.now)
+    source = Column(String(64), nullable=False)
+    content_hash = Column(String(40))
+    simhash = Column(BigInteger)
+    duplicate_of = Column(Integer, ForeignKey('news.id', ondelete='SET NULL'))
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+
+    __table_args__ = (
+        Index('ix_news_time_id', 'time', 'id'),
+        Index('ix_news_created_at_id', 'created_at', 'id'),
+        Index('ix_news_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_news_source_time_id', 'source', 'time', 'id'),
+        Index('ix_news_content_hash', 'content_hash'),
+    )
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+
+    name = Column(String(100), primary_key=True)
+    applied_at = Column(DateTime, default=datetime.now)
+
+class NewsRawHtml(Base):
+    __tablename__ = 'news_raw_html'
+
+    news_id = Column(Integer, ForeignKey('news.id', ondelete='CASCADE'), primary_key=True)
+    compression = Column(String(8), nullable=False)
+    encoding = Column(String(32))
+    body = Column(LargeBinary, nullable=False)
+    fetched_at = Column(DateTime, default=datetime.now)
+
+_engine = None
+_session_factory = None
+_engine_lock = asyncio.Lock()
+_news_update_listeners = []
+
+def on_news_updated(callback):
+    _news_update_listeners.append(callback)
+
+def _notify_news_updated(news_ids=None):
+    for callback in _news_update_listeners:
+        try:
+            callback(news_ids)
+        except Exception as e:
+            logger.error("Ошибка обработчика обновления новостей: %s", e)
+
+# обновления пишет процесс парсера, а кэши ответов живут в процессах API, поэтому изменения рассылаются через NOTIFY
+NEWS_UPDATED_CHANNEL = 'news_updated'
+# полезная нагрузка NOTIFY ограничена 8000 байтами; длинный список заменяется пустой строкой - "сбросить всё"
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+def _news_updated_statement(news_ids=None):
+    payload = ','.join(map(str, news_ids)) if news_ids else ''
+    if len(payload) > NOTIFY_PAYLOAD_LIMIT:
+        payload = ''
+    # уведомление уходит только при фиксации транзакции, поэтому откат ничего не сбрасывает
+    return select(func.pg_notify(NEWS_UPDATED_CHANNEL, payload))
+
+def _on_news_updated_notification(connection, pid, channel, payload):
+    _notify_news_updated([int(news_id) for news_id in payload.split(',')] if payload else None)
+
+async def listen_news_updates(retry_interval=5.0):
+    # держит одно соединение пула с LISTEN, пока задачу не отменят; после разрыва переподключается
+    reconnect = False
+    while True:
+        try:
+            # при старте API база может быть ещё недоступна
+            if not await init_engine():
+                raise OSError("пул подключений не создан")
+
+            async with _engine.connect() as conn:
+                driver_connection = (await conn.get_raw_connection()).driver_connection
+                lost = asyncio.Event()
+                driver_connection.add_termination_listener(lambda connection: lost.set())
+                await driver_connection.add_listener(NEWS_UPDATED_CHANNEL, _on_news_updated_notification)
+
+                # пока соединения не было, уведомления могли потеряться
+                if reconnect:
+                    _notify_news_updated()
+                logger.info("Подписка на обновления новостей (%s) активна", NEWS_UPDATED_CHANNEL)
+
+                try:
+                    await lost.wait()
+                finally:
+                    if not driver_connection.is_closed():
+                        await driver_connection.remove_listener(NEWS_UPDATED_CHANNEL, _on_news_updated_notification)
+            logger.warning("Соединение подписки на обновления новостей потеряно")
+        except Exception as e:
+            logger.error("Ошибка подписки на обновления новостей: %s", e)
+
+        reconnect = True
+        await asyncio.sleep(retry_interval)
+
+def _create_schema(sync_conn):
+    Base.metadata.create_all(sync_conn)
+
+    existing_columns = dict(sync_conn.execute(text(
+        "SELECT column_name, is_generated FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'news'"
+    )).all())
+    for column, statement in COLUMN_UPGRADES:
+        if column not in existing_columns:
+            logger.info("Добавление колонки news.%s", column)
+            sync_conn.execute(text(statement))
+
+    # в старых базах search_vector - обычная колонка, которую заполнял отдельный UPDATE после вставки
+    if existing_columns.get('search_vector') == 'NEVER':
+        logger.warning("Перевод news.search_vector в вычисляемую колонку, таблица news будет переписана")
+        sync_conn.execute(text(f"ALTER TABLE news DROP COLUMN search_vector, ADD COLUMN {SEARCH_VECTOR_COLUMN}"))
+
+    _apply_storage_settings(sync_conn)
+
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+async def _run_backfills(engine):
+    async with engine.connect() as conn:
+        applied = set((await conn.execute(select(SchemaMigration.name))).scalars())
+
+    batch_size = int(os.getenv('DB_BACKFILL_BATCH_SIZE', '5000'))
+    for name, statement in DATA_BACKFILLS:
+        if name in applied:
+            continue
+
+        async with engine.connect() as conn:
+            min_id, max_id = (await conn.execute(select(func.min(News.id), func.max(News.id)))).one()
+
+        if min_id is not None:
+            logger.info("Заполнение %s для id %s..%s", name, min_id, max_id)
+            # новые строки пишутся уже заполненными, поэтому достаточно пройти до текущего max(id)
+            for start in range(min_id - 1, max_id, batch_size):
+                async with engine.begin() as conn:
+                    await conn.execute(text(statement), {'start': start, 'end': start + batch_size})
+
+        async with engine.begin() as conn:
+            await conn.execute(pg_insert(SchemaMigration).values(name=name).on_conflict_do_nothing())
+        logger.info("Заполнение %s завершено", name)
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # журнал пула остаётся в пространстве имён sqlalchemy, а не в логгере модуля
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.AsyncAdaptedQueuePool'
+
+    # у пула нет события начала ожидания, поэтому время выдачи соединения (очередь и новое подключение)
+    # меряется здесь, когда сессия действительно выполняет первый запрос
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+def naive_local(value):
+    # колонки времени хранят локальное время без зоны, а asyncpg не принимает для них значения с зоной
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+def get_database_url():
+    database_name = os.getenv('DB_NAME', 'news_db')
+    return f"postgresql+asyncpg://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{database_name}"
+
+async def init_engine():
+    global _engine, _session_factory
+
+    async with _engine_lock:
+        if _engine is not None:
+            return True
+
+        engine = None
+        try:
+            engine = create_async_engine(
+                get_database_url(),
+                echo=False,
+                poolclass=TimedQueuePool,
+                pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+                max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+                pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+                pool_pre_ping=os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+            )
+
+            async with engine.begin() as conn:
+                await conn.run_sync(_create_schema)
+            await _run_backfills(engine)
+
+            _engine = engine
+            _session_factory = async_sessionmaker(
+                engine,
+                class_=AsyncSession,
+                expire_on_commit=False
+            )
+            logger.info("Пул подключений создан, база данных и таблицы инициализированы")
+            return True
+
+        except (SQLAlchemyError, OSError) as e:
+            logger.error("Ошибка инициализации базы данных: %s", e)
+            if engine is not None:
+                await engine.dispose()
+            return False
+
+async def dispose_engine():
+    global _engine, _session_factory
+
+    async with _engine_lock:
+        if _engine is None:
+            return
+
+        await _engine.dispose()
+        _engine = None
+        _session_factory = None
+        logger.info("Пул подключений к базе данных закрыт")
+
+async def find_existing_links(links):
+    db_manager = DataBaseManager()
+    try:
+        if not await db_manager.create_connection():
+            return set()
+        return await db_manager.filter_existing_links(links)
+    finally:
+        await db_manager.close_connection()
+
+async def store_news(news_dict, update_existing=False):
+    db_manager = DataBaseManager()
+    try:
+        if not await db_manager.create_connection():
+            logger.error("Не удалось подключиться к базе данных")
+            return {'inserted': 0, 'updated': 0, 'skipped': 0, 'failed': len(news_dict)}
+        return await db_manager.upsert_news(news_dict, update_existing=update_existing)
+    finally:
+        await db_manager.close_connection()
+
+class AdvisoryLock:
+    def __init__(self, key):
+        self.key = key
+        self._connection = None
+
+    @property
+    def held(self):
+        return self._connection is not None
+
+    async def acquire(self):
+        if self._connection is not None:
+            # блокировка живёт, пока жива сессия Postgres, поэтому проверяем само соединение
+            try:
+                await self._connection.execute(text("SELECT 1"))
+                return True
+            except (SQLAlchemyError, OSError) as e:
+                logger.warning("Соединение с блокировкой %s потеряно: %s", self.key, e)
+                await self._discard()
+
+        if not await init_engine():
+            return False
+
+        connection = None
+        try:
+            connection = await _engine.connect()
+            await connection.execution_options(isolation_level='AUTOCOMMIT')
+            acquired = (await connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {'key': self.key}
+            )).scalar()
+        except (SQLAlchemyError, OSError) as e:
+            logger.error("Ошибка получения блокировки %s: %s", self.key, e)
+            acquired = False
+
+        if acquired:
+            self._connection = connection
+            logger.info("Получена блокировка %s", self.key)
+            return True
+
+        if connection is not None:
+            await connection.close()
+        return False
+
+    async def release(self):
+        if self._connection is None:
+            return
+
+        try:
+            await self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': self.key})
+        except (SQLAlchemyError, OSError) as e:
+            logger.error("Ошибка снятия блокировки %s: %s", self.key, e)
+        await self._discard()
+        logger.info("Блокировка %s снята", self.key)
+
+    async def _discard(self):
+        connection, self._connection = self._connection, None
+        try:
+            await connection.close()
+        except (SQLAlchemyError, OSError):
+            pass
 
 class DataBaseManager:
     def __init__(self):
@@ -35,92 +392,245 @@ class DataBaseManager:
     async def initialize_database(self):
         if self._initialized:
             return True
-            
-        try:
-            database_name = os.getenv('DB_NAME', 'news_db')
-            database_url = f"postgresql+asyncpg://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{database_name}"
-            
-            self.engine = create_async_engine(database_url, echo=False)
-            self.async_session = async_sessionmaker(
-                self.engine, 
-                class_=AsyncSession, 
-                expire_on_commit=False
-            )
-            
-            async with self.engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-            
-            logger.info("База данных и таблицы инициализированы")
-            self._initialized = True
-            return True
-            
-        except SQLAlchemyError as e:
-            logger.error(f"Ошибка инициализации базы данных: {e}")
+
+        if not await init_engine():
             return False
 
+        self.engine = _engine
+        self.async_session = _session_factory
+        self._initialized = True
+        return True
+
     async def create_connection(self):
-        logger.info(f"Создание подключения: _initialized={self._initialized}, async_session={self.async_session is not None}")
+        logger.debug("Создание подключения: _initialized=%s, async_session=%s", self._initialized, self.async_session is not None)
         
         if not self._initialized:
-            logger.info("База не инициализирована, запускаем инициализацию")
+            logger.debug("База не инициализирована, запускаем инициализацию")
             if not await self.initialize_database():
                 return False
         
         try:
             if not self.async_session:
-                logger.info("async_session отсутствует, запускаем инициализацию")
+                logger.debug("async_session отсутствует, запускаем инициализацию")
                 if not await self.initialize_database():
                     return False
             
             self.session = self.async_session()
-            logger.info(f"Сессия создана успешно: {self.session is not None}")
+            logger.debug("Сессия создана успешно: %s", self.session is not None)
             return True
             
-        except SQLAlchemyError as e:
-            logger.error(f"Ошибка подключения: {e}")
+        except (SQLAlchemyError, OSError) as e:
+            logger.error("Ошибка подключения: %s", e)
+            if self.session is not None:
+                await self.session.close()
+                self.session = None
             return False
 
-    async def insert_news(self, news_dict):
+    async def insert_news(self, news_dict, update_existing=False):
+        counts = await self.upsert_news(news_dict, update_existing=update_existing)
+        return counts['inserted']
+
+    async def upsert_news(self, news_dict, update_existing=False, chunk_size=None):
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0, 'failed': 0, 'duplicates': 0}
+
         if not self.session:
             logger.error("Нет активной сессии с базой данных")
-            return 0
-            
-        try:
-            inserted_count = 0
-            
-            for link, news_data in news_dict.items():
-                existing_news = await self.session.execute(
-                    select(News).where(News.link == link)
+            return counts
+
+        if not news_dict:
+            return counts
+
+        chunk_size = chunk_size or int(os.getenv('DB_BULK_CHUNK_SIZE', '1000'))
+        created_at = datetime.now()
+        rows = []
+        raw_html = {}
+
+        for link, news_data in news_dict.items():
+            # без источника строку потом не отличить от новостей uralpolit.ru, поэтому такие данные не пишутся
+            if not news_data.get('source'):
+                raise ValueError(f"Не указан источник новости {link}")
+            if news_data.get('raw_html'):
+                raw_html[link] = news_data['raw_html']
+
+            content = news_data.get('content', '')
+            # конвейер считает отпечатки в процессах разбора, остальным вызовам они считаются здесь
+            hashes = news_data if 'content_hash' in news_data else fingerprint(content, near_duplicate_distance() > 0)
+            rows.append({
+                'title': news_data['title'],
+                'time': news_data['time'],
+                'link': link,
+                'content': content,
+                'source': news_data['source'],
+                'content_hash': hashes['content_hash'],
+                'simhash': hashes.get('simhash'),
+                'duplicate_of': None,
+                'created_at': created_at
+            })
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+
+            started = time.perf_counter()
+            try:
+                duplicate_index = await self._load_duplicate_index(chunk)
+                returned, duplicates = await self._write_chunk(chunk, update_existing, duplicate_index)
+
+                if raw_html:
+                    await self._write_raw_html(chunk, returned, raw_html, created_at)
+
+                updated_ids = [row.id for row in returned if not row.inserted]
+                if updated_ids:
+                    await self.session.execute(_news_updated_statement(updated_ids))
+
+                await self.session.commit()
+
+                counts['inserted'] += len(returned) - len(updated_ids)
+                counts['updated'] += len(updated_ids)
+                counts['skipped'] += len(chunk) - len(returned)
+                counts['duplicates'] += duplicates
+
+                if updated_ids:
+                    _notify_news_updated(updated_ids)
+
+            except SQLAlchemyError as e:
+                logger.error("Ошибка вставки данных: %s", e)
+                await self.session.rollback()
+                counts['failed'] += len(chunk)
+
+            DB_WRITE_SECONDS.observe(time.perf_counter() - started)
+
+        record_article_counts(counts)
+        logger.info("Добавлено %s (из них дубликатов %s), обновлено %s, пропущено %s, ошибок %s новостей", counts['inserted'], counts['duplicates'], counts['updated'], counts['skipped'], counts['failed'])
+        return counts
+
+    async def _load_duplicate_index(self, rows):
+        index = DuplicateIndex(near_duplicate_distance())
+
+        hashes = list({row['content_hash'] for row in rows if row['content_hash']})
+        if hashes:
+            result = await self.session.execute(
+                select(News.id, News.link, News.content_hash).where(
+                    News.content_hash == any_(bindparam('hashes', hashes, type_=ARRAY(String))),
+                    News.duplicate_of.is_(None)
+                ).order_by(News.id)
+            )
+            for row in result:
+                index.add(row.id, row.link, row.content_hash)
+
+        # перепечатки появляются почти одновременно с оригиналом, поэтому кандидаты берутся из окна по времени
+        times = [row['time'] for row in rows if row['simhash'] is not None]
+        if index.max_distance and times:
+            window = timedelta(hours=near_duplicate_window())
+            result = await self.session.execute(
+                select(News.id, News.link, News.simhash).where(
+                    News.simhash.isnot(None),
+                    News.duplicate_of.is_(None),
+                    News.time >= min(times) - window,
+                    News.time <= max(times) + window
+                ).order_by(News.id)
+            )
+            for row in result:
+                index.add(row.id, row.link, None, row.simhash)
+
+        return index
+
+    async def _write_chunk(self, chunk, update_existing, duplicate_index):
+        returned = []
+        duplicates = 0
+        pending = chunk
+
+        while pending:
+            batch, deferred = [], []
+            batch_index = DuplicateIndex(duplicate_index.max_distance)
+
+            for row in pending:
+                row['duplicate_of'] = duplicate_index.find(row['link'], row['content_hash'], row['simhash'])
+                if row['duplicate_of'] is not None:
+                    # дубликат хранится только как ссылка на оригинал, без текста
+                    row['content'] = None
+                elif batch_index.find(row['link'], row['content_hash'], row['simhash']) is not None:
+                    # оригинал вставляется этим же запросом, его id будет известен только после него
+                    deferred.append(row)
+                    continue
+                else:
+                    batch_index.add(row['link'], row['link'], row['content_hash'], row['simhash'])
+                batch.append(row)
+
+            result = await self.session.execute(self._build_upsert(batch, update_existing))
+            batch_returned = result.all()
+            returned.extend(batch_returned)
+
+            rows_by_link = {row['link']: row for row in batch}
+            for returned_row in batch_returned:
+                row = rows_by_link[returned_row.link]
+                if row['duplicate_of'] is None:
+                    duplicate_index.add(returned_row.id, returned_row.link, row['content_hash'], row['simhash'])
+                else:
+                    duplicates += 1
+
+            pending = deferred
+
+        return returned, duplicates
+
+    async def _write_raw_html(self, chunk, returned, raw_html, fetched_at):
+        rows_by_link = {row['link']: row for row in chunk}
+        raw_rows = [
+            {
+                'news_id': returned_row.id,
+                'compression': raw_html[returned_row.link]['compression'],
+                'encoding': raw_html[returned_row.link]['encoding'],
+                'body': raw_html[returned_row.link]['body'],
+                'fetched_at': fetched_at
+            }
+            for returned_row in returned
+            # у дубликатов нет своего текста, исходник хранится только у оригинала
+            if returned_row.link in raw_html and rows_by_link[returned_row.link]['duplicate_of'] is None
+        ]
+        if not raw_rows:
+            return
+
+        stmt = pg_insert(NewsRawHtml).values(raw_rows)
+        await self.session.execute(stmt.on_conflict_do_update(
+            index_elements=[NewsRawHtml.news_id],
+            set_={
+                'compression': stmt.excluded.compression,
+                'encoding': stmt.excluded.encoding,
+                'body': stmt.excluded.body,
+                'fetched_at': stmt.excluded.fetched_at
+            }
+        ))
+
+    @staticmethod
+    def _build_upsert(rows, update_existing):
+        stmt = pg_insert(News).values(rows)
+
+        if update_existing:
+            # пустой content означает, что статью не удалось скачать, а не что её очистили
+            new_content = func.coalesce(func.nullif(stmt.excluded.content, ''), News.content)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[News.link],
+                set_={
+                    'title': stmt.excluded.title,
+                    'content': new_content,
+                    'content_hash': func.coalesce(stmt.excluded.content_hash, News.content_hash),
+                    'simhash': func.coalesce(stmt.excluded.simhash, News.simhash)
+                },
+                where=or_(
+                    News.title.is_distinct_from(stmt.excluded.title),
+                    News.content.is_distinct_from(new_content)
                 )
-                existing_news = existing_news.scalar_one_or_none()
-                
-                if not existing_news:
-                    news = News(
-                        title=news_data['title'],
-                        time=news_data['time'],
-                        link=link,
-                        content=news_data.get('content', '')
-                    )
-                    
-                    self.session.add(news)
-                    inserted_count += 1
-            
-            await self.session.commit()
-            logger.info(f"Успешно добавлено {inserted_count} новостей")
-            return inserted_count
-            
-        except SQLAlchemyError as e:
-            logger.error(f"Ошибка вставки данных: {e}")
-            await self.session.rollback()
-            return 0
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[News.link])
+
+        # xmax = 0 только у строк, вставленных этим запросом, а не обновлённых
+        return stmt.returning(News.id, News.link, literal_column('xmax = 0').label('inserted'))
 
     async def close_connection(self):
         if self.session:
             await self.session.close()
-            logger.info("Сессия с базой данных закрыта")
-        
-        if self.engine:
-            await self.engine.dispose()
+            self.session = None
+            logger.debug("Сессия с базой данных закрыта")
 
     async def clear_database(self):
         if not self.session:
@@ -128,12 +638,14 @@ class DataBaseManager:
             return False
             
         try:
-            await self.session.execute(text("TRUNCATE TABLE news RESTART IDENTITY"))
+            await self.session.execute(text("TRUNCATE TABLE news, news_raw_html RESTART IDENTITY"))
+            await self.session.execute(_news_updated_statement())
             await self.session.commit()
+            _notify_news_updated()
             logger.info("База данных успешно очищена")
             return True
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка очистки базы данных: {e}")
+            logger.error("Ошибка очистки базы данных: %s", e)
             await self.session.rollback()
             return False
 
@@ -146,18 +658,169 @@ class DataBaseManager:
             links = result.scalars().all()
             return {link for link in links}
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка получения ссылок: {e}")
+            logger.error("Ошибка получения ссылок: %s", e)
+            return set()
+
+    async def filter_existing_links(self, links):
+        if not self.session or not links:
+            return set()
+
+        try:
+            result = await self.session.execute(
+                select(News.link).where(News.link == any_(bindparam('links', list(links), type_=ARRAY(String))))
+            )
+            return set(result.scalars().all())
+        except SQLAlchemyError as e:
+            logger.error("Ошибка проверки существующих ссылок: %s", e)
             return set()
 
-    async def get_news_by_id(self, news_id: int):
+    async def get_news_by_id(self, news_id: int, with_content=True):
         if not self.session:
             return None
             
+        try:
+            query = select(News).where(News.id == news_id)
+            if with_content:
+                query = query.options(undefer(News.content))
+            result = await self.session.execute(query)
+            return result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            logger.error("Ошибка получения новости по ID: %s", e)
+            return None
+
+    async def get_raw_html(self, news_id):
+        if not self.session:
+            return None
+
+        try:
+            result = await self.session.execute(select(NewsRawHtml).where(NewsRawHtml.news_id == news_id))
+            raw = result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            logger.error("Ошибка получения исходного HTML новости: %s", e)
+            return None
+
+        if raw is None:
+            return None
+        return decompress_body(raw.body, raw.compression), raw.encoding
+
+    async def get_news_by_ids(self, news_ids, fields=None):
+        if not self.session:
+            return None
+
+        news_ids = list(dict.fromkeys(news_ids))
+        if not news_ids:
+            return [], []
+
+        columns = [getattr(News, field) for field in (fields or ('id', 'title', 'time', 'link', 'content', 'created_at', 'source', 'duplicate_of'))]
+        if News.id not in columns:
+            columns.append(News.id)
+
         try:
             result = await self.session.execute(
-                select(News).where(News.id == news_id)
+                select(*columns).where(News.id == any_(bindparam('ids', news_ids, type_=ARRAY(Integer))))
             )
-            return result.scalar_one_or_none()
+            rows_by_id = {row.id: row for row in result}
+        except SQLAlchemyError as e:
+            logger.error("Ошибка получения новостей по списку ID: %s", e)
+            return None
+
+        rows = [rows_by_id[news_id] for news_id in news_ids if news_id in rows_by_id]
+        missing = [news_id for news_id in news_ids if news_id not in rows_by_id]
+        return rows, missing
+
+    async def list_news(self, limit=50, cursor=None, date_from=None, date_to=None, fields=None, source=None):
+        if not self.session:
+            return None
+
+        columns = [getattr(News, field) for field in (fields or ('id', 'title', 'time', 'link', 'created_at', 'source', 'duplicate_of'))]
+        for key_column in (News.time, News.id):
+            if key_column not in columns:
+                columns.append(key_column)
+
+        query = select(*columns)
+
+        if source is not None:
+            query = query.where(News.source == source)
+        if date_from is not None:
+            query = query.where(News.time >= naive_local(date_from))
+        if date_to is not None:
+            query = query.where(News.time < naive_local(date_to))
+        if cursor is not None:
+            query = query.where(tuple_(News.time, News.id) < tuple_(naive_local(cursor[0]), cursor[1]))
+
+        query = query.order_by(News.time.desc(), News.id.desc()).limit(limit + 1)
+
+        try:
+            result = await self.session.execute(query)
+            rows = result.all()
+        except SQLAlchemyError as e:
+            logger.error("Ошибка получения списка новостей: %s", e)
+            return None
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1].time, rows[-1].id)
+
+        return rows, next_cursor
+
+    async def search_news(self, query_text, limit=20, cursor=None):
+        if not self.session:
+            return None
+
+        ts_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), query_text)
+        rank = func.ts_rank_cd(News.search_vector, ts_query)
+
+        page = select(
+            News.id, News.title, News.time, News.link, News.created_at, News.source, News.duplicate_of, rank.label('rank')
+        ).where(
+            News.search_vector.op('@@')(ts_query),
+            News.duplicate_of.is_(None)
+        )
+        if cursor is not None:
+            page = page.where(tuple_(rank, News.id) < tuple_(*cursor))
+        page = page.order_by(rank.desc(), News.id.desc()).limit(limit + 1).subquery()
+
+        # сниппеты считаются только для строк текущей страницы
+        snippet = func.ts_headline(
+            literal_column(f"'{SEARCH_CONFIG}'::regconfig"),
+            News.content,
+            ts_query,
+            literal_column("'MaxFragments=2, MaxWords=30, MinWords=10, StartSel=<b>, StopSel=</b>'")
+        )
+        query = select(page, snippet.label('snippet')).join(News, News.id == page.c.id).order_by(
+            page.c.rank.desc(), page.c.id.desc()
+        )
+
+        try:
+            result = await self.session.execute(query)
+            rows = result.all()
+        except SQLAlchemyError as e:
+            logger.error("Ошибка полнотекстового поиска: %s", e)
+            return None
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1].rank, rows[-1].id)
+
+        return rows, next_cursor
+
+    async def stream_news(self, since=None, fields=None, batch_size=1000):
+        if not self.session:
+            logger.error("Нет активной сессии с базой данных")
+            return
+
+        columns = [getattr(News, field) for field in (fields or ('id', 'title', 'time', 'link', 'content', 'created_at', 'source', 'duplicate_of'))]
+        query = select(*columns).order_by(News.created_at, News.id)
+        if since is not None:
+            query = query.where(News.created_at > naive_local(since))
+
+        try:
+            result = await self.session.stream(query.execution_options(yield_per=batch_size))
+            async for partition in result.partitions():
+                for row in partition:
+                    yield row
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка получения новости по ID: {e}")
-            return None
\ No newline at end of file
+            logger.error("Ошибка потоковой выгрузки новостей: %s", e)
+            raise
@@ -0,0 +1,113 @@
+import os
+import re
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMS = frozenset(('fbclid', 'gclid', 'yclid', 'ysclid', '_openstat', 'mc_cid', 'mc_eid'))
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+SIMHASH_SHINGLE = 3
+
+_WORD_RE = re.compile(r'\w+')
+
+def min_words():
+    # короче этого текст не хэшируется: у разных заметок-однострочников слишком легко совпасть
+    return int(os.getenv('DEDUP_MIN_WORDS', '20'))
+
+def near_duplicate_distance():
+    # 0 отключает поиск почти-дубликатов по SimHash
+    return int(os.getenv('DEDUP_NEAR_DISTANCE', '0'))
+
+def near_duplicate_window():
+    return float(os.getenv('DEDUP_NEAR_WINDOW_HOURS', '48'))
+
+def canonicalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TRACKING_PARAMS and not key.startswith(TRACKING_PREFIXES)
+    )
+
+    return urlunsplit((scheme, netloc, parts.path or '/', urlencode(query), ''))
+
+def content_words(content):
+    return _WORD_RE.findall(content.lower()) if content else []
+
+def content_hash(words):
+    return hashlib.sha1(' '.join(words).encode('utf-8')).hexdigest()
+
+def simhash(words):
+    if len(words) < SIMHASH_SHINGLE:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + SIMHASH_SHINGLE]) for i in range(len(words) - SIMHASH_SHINGLE + 1)]
+
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    result = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            result |= 1 << bit
+
+    # в Postgres хранится как bigint со знаком
+    return result - (1 << 64) if result >= 1 << 63 else result
+
+def fingerprint(content, near_duplicates=False):
+    words = content_words(content)
+    if len(words) < min_words():
+        return {'content_hash': None, 'simhash': None}
+
+    return {
+        'content_hash': content_hash(words),
+        'simhash': simhash(words) if near_duplicates else None
+    }
+
+_MASK_64 = (1 << 64) - 1
+
+def hamming_distance(left, right):
+    return bin((left ^ right) & _MASK_64).count('1')
+
+class DuplicateIndex:
+    def __init__(self, max_distance=0):
+        self.max_distance = max_distance
+        self._by_hash = {}
+        self._bands = {}
+
+    def _simhash_bands(self, simhash):
+        # при расстоянии не больше max_distance хотя бы одна из max_distance + 1 полос совпадает целиком
+        width = 64 // (self.max_distance + 1)
+        value = simhash & _MASK_64
+        return [(band, value >> (band * width) & ((1 << width) - 1)) for band in range(self.max_distance + 1)]
+
+    def add(self, news_id, link, content_hash, simhash=None):
+        if content_hash:
+            self._by_hash.setdefault(content_hash, (news_id, link))
+        if simhash is not None and self.max_distance:
+            for band in self._simhash_bands(simhash):
+                self._bands.setdefault(band, []).append((simhash, news_id, link))
+
+    def find(self, link, content_hash, simhash=None):
+        original = self._by_hash.get(content_hash) if content_hash else None
+        if original is not None and original[1] != link:
+            return original[0]
+
+        if simhash is None or not self.max_distance:
+            return None
+
+        for band in self._simhash_bands(simhash):
+            for candidate, news_id, candidate_link in self._bands.get(band, ()):
+                if candidate_link != link and hamming_distance(candidate, simhash) <= self.max_distance:
+                    return news_id
+        return None
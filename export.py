@@ -0,0 +1,198 @@
+import os
+import io
+import csv
+import json
+import gzip
+from collections import deque
+from datetime import datetime, timedelta
+
+from db_utilities import DataBaseManager, naive_local
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+EXPORT_FIELDS = ('id', 'title', 'time', 'link', 'content', 'created_at', 'source', 'duplicate_of')
+EXPORT_FORMATS = ('ndjson', 'csv')
+# parquet - необязательный формат, для него нужен пакет pyarrow (нет в requirements.txt)
+SHARD_FORMATS = ('ndjson', 'parquet')
+MANIFEST_NAME = 'manifest.json'
+
+def _plain_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def row_to_dict(row, fields=EXPORT_FIELDS):
+    return {field: _plain_value(getattr(row, field)) for field in fields}
+
+async def iter_ndjson(rows, fields=EXPORT_FIELDS, rows_per_chunk=500):
+    lines = []
+    async for row in rows:
+        lines.append(json.dumps(row_to_dict(row, fields), ensure_ascii=False))
+        if len(lines) >= rows_per_chunk:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+async def iter_csv(rows, fields=EXPORT_FIELDS, rows_per_chunk=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    pending = 0
+
+    async for row in rows:
+        writer.writerow([_plain_value(getattr(row, field)) for field in fields])
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+class ShardWriter:
+    def __init__(self, output_dir, fmt, prefix):
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.prefix = prefix
+        self.shards = []
+
+        if fmt == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError as e:
+                raise RuntimeError("Для выгрузки в Parquet нужен пакет pyarrow") from e
+
+            self._pa = pyarrow
+            self._pq = pyarrow.parquet
+            self._schema = pyarrow.schema([
+                ('id', pyarrow.int64()),
+                ('title', pyarrow.string()),
+                ('time', pyarrow.timestamp('us')),
+                ('link', pyarrow.string()),
+                ('content', pyarrow.string()),
+                ('created_at', pyarrow.timestamp('us')),
+                ('source', pyarrow.string()),
+                ('duplicate_of', pyarrow.int64()),
+            ])
+
+    def write(self, rows):
+        extension = 'parquet' if self.fmt == 'parquet' else 'ndjson.gz'
+        path = os.path.join(self.output_dir, f"{self.prefix}-{len(self.shards):05d}.{extension}")
+
+        if self.fmt == 'parquet':
+            columns = {field: [getattr(row, field) for row in rows] for field in EXPORT_FIELDS}
+            table = self._pa.Table.from_pydict(columns, schema=self._schema)
+            self._pq.write_table(table, path, compression='zstd')
+        else:
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row_to_dict(row), ensure_ascii=False))
+                    f.write('\n')
+
+        self.shards.append(os.path.basename(path))
+        logger.info("Записан файл %s: %s строк", path, len(rows))
+
+def read_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def export_overlap():
+    return timedelta(seconds=float(os.getenv('EXPORT_OVERLAP_SECONDS', '300')))
+
+def resolve_since(output_dir, since, overlap=None):
+    # возвращает нижнюю границу created_at и id, уже выгруженные в пределах этой границы
+    if not since:
+        return None, set()
+
+    if since == 'last':
+        # created_at ставится приложением до фиксации транзакции, поэтому строка с меньшим created_at
+        # может появиться в базе позже уже выгруженных: окно перекрытия перечитывается, дубли отсеиваются по id
+        manifest = read_manifest(output_dir)
+        last = manifest.get('max_created_at')
+        if not last:
+            return None, set()
+        overlap = export_overlap() if overlap is None else overlap
+        return datetime.fromisoformat(last) - overlap, set(manifest.get('overlap_ids', ()))
+
+    # fromisoformat в Python 3.10 не понимает суффикс Z
+    if since.endswith('Z'):
+        since = since[:-1] + '+00:00'
+    return naive_local(datetime.fromisoformat(since)), set()
+
+async def run_export_async(output_dir, fmt='ndjson', since=None, shard_size=100000):
+    if fmt not in SHARD_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    overlap = export_overlap()
+    since, exported_ids = resolve_since(output_dir, since, overlap)
+    writer = ShardWriter(output_dir, fmt, prefix=f"news-{datetime.now():%Y%m%dT%H%M%S}")
+
+    logger.info("Выгрузка новостей в %s (%s), created_at > %s", output_dir, fmt, since)
+
+    db_manager = DataBaseManager()
+    total_rows = 0
+    skipped_rows = 0
+    max_created_at = since
+    # (created_at, id) строк из последнего окна перекрытия, для следующей выгрузки
+    recent = deque()
+
+    try:
+        if not await db_manager.create_connection():
+            logger.error("Не удалось подключиться к базе данных")
+            return None
+
+        shard = []
+        async for row in db_manager.stream_news(since=since, fields=EXPORT_FIELDS):
+            if row.created_at is not None:
+                max_created_at = max(max_created_at, row.created_at) if max_created_at else row.created_at
+                recent.append((row.created_at, row.id))
+                while recent[0][0] <= max_created_at - overlap:
+                    recent.popleft()
+
+            if row.id in exported_ids:
+                skipped_rows += 1
+                continue
+
+            shard.append(row)
+            if len(shard) >= shard_size:
+                writer.write(shard)
+                total_rows += len(shard)
+                shard = []
+
+        if shard:
+            writer.write(shard)
+            total_rows += len(shard)
+    finally:
+        await db_manager.close_connection()
+
+    manifest = read_manifest(output_dir)
+    manifest.update({
+        'format': fmt,
+        'since': since.isoformat() if since else None,
+        'max_created_at': max_created_at.isoformat() if max_created_at else None,
+        'overlap_ids': [news_id for _, news_id in recent],
+        'rows': total_rows,
+        'shards': writer.shards,
+        'exported_at': datetime.now().isoformat()
+    })
+    write_manifest(output_dir, manifest)
+
+    logger.info("Выгрузка завершена: %s строк в %s файлах, пропущено уже выгруженных: %s",
+                total_rows, len(writer.shards), skipped_rows)
+    return manifest
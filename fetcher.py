@@ -0,0 +1,233 @@
+import os
+import random
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from logger_config import setup_logger
+from metrics import HTTP_DOWNLOADED_BYTES, http_status_counter
+
+logger = setup_logger(__name__)
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+class FetchError(Exception):
+    def __init__(self, url, message, status=None):
+        super().__init__(f"{url}: {message}")
+        self.url = url
+        self.status = status
+
+class FetchResult:
+    def __init__(self, url, status, body, encoding, headers):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.encoding = encoding
+        self.headers = headers
+
+class HostRateLimiter:
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0
+        self._next_slot = {}
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+
+        host = urlsplit(url).netloc
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class AdaptiveLimiter:
+    def __init__(self, initial=5, minimum=1, maximum=20, target_latency=2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        delay = self.paused_until - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        if latency > self.target_latency:
+            self._decrease(0.75)
+            return
+
+        # аддитивный рост: +1 слот после limit подряд успешных быстрых ответов
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1)
+            self._successes = 0
+
+    def on_overload(self):
+        self._decrease(0.5)
+
+    def pause(self, delay):
+        self.paused_until = max(self.paused_until, asyncio.get_running_loop().time() + delay)
+
+    def _decrease(self, factor):
+        now = asyncio.get_running_loop().time()
+        self._successes = 0
+
+        # один всплеск ошибок не должен обрушить лимит до минимума
+        if now - self._last_decrease < self.target_latency:
+            return
+
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+
+class AdaptiveFetcher:
+    def __init__(self, initial_concurrency=5, max_concurrency=20, target_latency=2.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=30.0, retry_after_max=300.0, rate_limit=None, timeout=30):
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.rate_limiter = HostRateLimiter(rate_limit)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+        self._hosts = {}
+
+    @classmethod
+    def from_env(cls, rate_limit=None):
+        return cls(
+            initial_concurrency=int(os.getenv('FETCH_CONCURRENCY', '5')),
+            max_concurrency=int(os.getenv('FETCH_MAX_CONCURRENCY', '20')),
+            target_latency=float(os.getenv('FETCH_TARGET_LATENCY', '2.0')),
+            max_retries=int(os.getenv('FETCH_MAX_RETRIES', '3')),
+            retry_after_max=float(os.getenv('FETCH_RETRY_AFTER_MAX', '300')),
+            rate_limit=rate_limit,
+            timeout=float(os.getenv('FETCH_TIMEOUT', '30'))
+        )
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency * 4,
+                limit_per_host=self.max_concurrency,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    def _get_host(self, url):
+        host = urlsplit(url).netloc
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = self._hosts[host] = AdaptiveLimiter(
+                initial=self.initial_concurrency,
+                maximum=self.max_concurrency,
+                target_latency=self.target_latency
+            )
+        return limiter
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, headers):
+        value = headers.get('Retry-After') if headers else None
+        if not value:
+            return None
+
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+
+        return max(delay, 0.0)
+
+    async def get(self, url, headers=None):
+        loop = asyncio.get_running_loop()
+        limiter = self._get_host(url)
+        session = self._get_session()
+
+        for attempt in range(self.max_retries + 1):
+            status = None
+            error = None
+
+            await limiter.acquire()
+            try:
+                await self.rate_limiter.wait(url)
+                started = loop.time()
+                async with session.get(url, headers=headers) as response:
+                    status = response.status
+                    response_headers = response.headers
+                    body = await response.read()
+                    encoding = response.get_encoding() if body else 'utf-8'
+                latency = loop.time() - started
+                http_status_counter(status).inc()
+                HTTP_DOWNLOADED_BYTES.inc(len(body))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+                http_status_counter('error').inc()
+            finally:
+                await limiter.release()
+
+            if error is None and status not in RETRY_STATUSES:
+                if status >= 400:
+                    raise FetchError(url, f"HTTP {status}", status=status)
+
+                limiter.on_success(latency)
+                return FetchResult(url, status, body, encoding, response_headers)
+
+            limiter.on_overload()
+
+            delay = None
+            if error is None:
+                delay = self._retry_after(response_headers)
+                if delay is not None:
+                    # хост просит подождать: пауза на весь срок действует и на остальные запросы к нему
+                    limiter.pause(delay)
+                    if delay > self.retry_after_max:
+                        raise FetchError(url, f"HTTP {status}, Retry-After {delay:.0f}s", status=status)
+
+            if attempt == self.max_retries:
+                break
+
+            delay = delay if delay is not None else self._backoff(attempt)
+            logger.warning(
+                "Retrying %s in %.1fs (attempt %s/%s, %s, concurrency %s)",
+                url, delay, attempt + 1, self.max_retries,
+                f"HTTP {status}" if error is None else error, int(limiter.limit)
+            )
+            await asyncio.sleep(delay)
+
+        if error is not None:
+            raise FetchError(url, str(error) or type(error).__name__)
+        raise FetchError(url, f"HTTP {status}", status=status)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,295 @@
+import os
+import re
+import hashlib
+
+from bs4 import BeautifulSoup
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# строки внутри этих тегов BeautifulSoup не считает текстом страницы при get_text()
+_STRING_CONTAINER_TAGS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+
+class Selector:
+    __slots__ = ('tag', 'attr', 'value')
+
+    def __init__(self, tag, attr=None, value=None):
+        self.tag = tag
+        self.attr = attr
+        self.value = value
+
+    def bs4_attrs(self):
+        return {self.attr: self.value} if self.attr else {}
+
+    def matches(self, element):
+        if element.tag != self.tag:
+            return False
+        if not self.attr:
+            return True
+        # class сравнивается по отдельным классам, как в BeautifulSoup
+        if self.attr == 'class':
+            return self.value in (element.get('class') or '').split()
+        return element.get(self.attr) == self.value
+
+class SourceSelectors:
+    __slots__ = ('item', 'title', 'time', 'content')
+
+    def __init__(self, item, title, time, content):
+        self.item = item
+        self.title = title
+        self.time = time
+        self.content = content
+
+    def fingerprint(self):
+        # меняется вместе с любым селектором; по нему кэш ответов отличает результаты разбора
+        parts = [(selector.tag, selector.attr, selector.value) for selector in (self.item, self.title, self.time, self.content)]
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+DEFAULT_SELECTORS = SourceSelectors(
+    item=Selector('article', 'class', 'news-article'),
+    title=Selector('a', 'class', 'news-article__title'),
+    time=Selector('time'),
+    content=Selector('div', 'itemprop', 'articleBody')
+)
+
+class HtmlBackend:
+    name = None
+
+    def extract_news_items(self, html_content, selectors=DEFAULT_SELECTORS):
+        raise NotImplementedError
+
+    def extract_content(self, html_content, selectors=DEFAULT_SELECTORS):
+        raise NotImplementedError
+
+    def _iter_children(self, node):
+        raise NotImplementedError
+
+    def _tag_name(self, node):
+        raise NotImplementedError
+
+    def _strip_text(self, node):
+        raise NotImplementedError
+
+    def _assemble_content(self, content_element):
+        content_parts = []
+
+        for element in self._iter_children(content_element):
+            if isinstance(element, str):
+                continue
+
+            tag_name = self._tag_name(element)
+            if tag_name == 'p' or (tag_name in ('div', 'span') and self._strip_text(element)):
+                element_text = self._element_text(element)
+                if element_text:
+                    content_parts.append(element_text)
+
+        return _WHITESPACE_RE.sub(' ', ' '.join(content_parts)).strip()
+
+    def _element_text(self, root):
+        stack = [([], self._iter_children(root))]
+
+        while stack:
+            text_parts, children = stack[-1]
+
+            for child in children:
+                if isinstance(child, str):
+                    text_parts.append(child)
+                elif self._tag_name(child) == 'a':
+                    link_text = self._strip_text(child)
+                    if link_text:
+                        if text_parts and not text_parts[-1].endswith(' '):
+                            text_parts.append(' ')
+                        text_parts.append(link_text)
+                        text_parts.append(' ')
+                else:
+                    stack.append(([], self._iter_children(child)))
+                    break
+            else:
+                stack.pop()
+                result = _WHITESPACE_RE.sub(' ', ''.join(text_parts)).strip()
+                if not stack:
+                    return result
+                if result:
+                    stack[-1][0].append(result)
+
+        return ''
+
+class BeautifulSoupBackend(HtmlBackend):
+    def __init__(self, features='html.parser', name=None):
+        self.name = name or features
+        self.features = features
+
+    def extract_news_items(self, html_content, selectors=DEFAULT_SELECTORS):
+        if not html_content:
+            return []
+
+        soup = BeautifulSoup(html_content, self.features)
+        news_items = []
+
+        for news_item in soup.find_all(selectors.item.tag, attrs=selectors.item.bs4_attrs()):
+            title_element = news_item.find(selectors.title.tag, attrs=selectors.title.bs4_attrs())
+            time_element = news_item.find(selectors.time.tag, attrs=selectors.time.bs4_attrs())
+
+            if title_element and time_element:
+                news_items.append({
+                    'href': title_element.get('href'),
+                    'title': title_element.get_text(strip=True),
+                    'time': time_element.get_text(strip=True)
+                })
+
+        return news_items
+
+    def extract_content(self, html_content, selectors=DEFAULT_SELECTORS):
+        if not html_content:
+            return ""
+
+        soup = BeautifulSoup(html_content, self.features)
+        content_element = soup.find(selectors.content.tag, attrs=selectors.content.bs4_attrs())
+
+        if content_element:
+            return self._assemble_content(content_element)
+        return ""
+
+    def _iter_children(self, node):
+        return iter(node.children)
+
+    def _tag_name(self, node):
+        return node.name
+
+    def _strip_text(self, node):
+        return node.get_text(strip=True)
+
+class LxmlBackend(HtmlBackend):
+    name = 'lxml'
+
+    def __init__(self):
+        try:
+            import lxml.html
+        except ImportError as e:
+            raise RuntimeError("Для PARSER_BACKEND=lxml нужен пакет lxml") from e
+
+        self._fromstring = lxml.html.fromstring
+        self._html_parser = lxml.html.HTMLParser(encoding='utf-8')
+
+    def _parse(self, html_content):
+        if isinstance(html_content, str):
+            html_content = html_content.encode('utf-8')
+        return self._fromstring(html_content, parser=self._html_parser)
+
+    def extract_news_items(self, html_content, selectors=DEFAULT_SELECTORS):
+        if not html_content:
+            return []
+
+        root = self._parse(html_content)
+        news_items = []
+
+        for news_item in root.iter(selectors.item.tag):
+            if not selectors.item.matches(news_item):
+                continue
+
+            title_element = self._find(news_item, selectors.title)
+            time_element = self._find(news_item, selectors.time)
+
+            if title_element is not None and time_element is not None:
+                news_items.append({
+                    'href': title_element.get('href'),
+                    'title': self._strip_text(title_element),
+                    'time': self._strip_text(time_element)
+                })
+
+        return news_items
+
+    def extract_content(self, html_content, selectors=DEFAULT_SELECTORS):
+        if not html_content:
+            return ""
+
+        content_element = self._find(self._parse(html_content), selectors.content)
+
+        if content_element is not None:
+            return self._assemble_content(content_element)
+        return ""
+
+    @staticmethod
+    def _find(root, selector):
+        return next((element for element in root.iter(selector.tag) if selector.matches(element)), None)
+
+    def _iter_children(self, node):
+        if node.text:
+            yield node.text
+
+        for child in node:
+            if isinstance(child.tag, str):
+                yield child
+            else:
+                # комментарии и инструкции BeautifulSoup отдаёт как строки
+                yield child.text or ''
+
+            if child.tail:
+                yield child.tail
+
+    def _tag_name(self, node):
+        return node.tag
+
+    def _strip_text(self, node):
+        if any(ancestor.tag in _STRING_CONTAINER_TAGS for ancestor in node.iterancestors()):
+            return ''
+
+        text_parts = []
+
+        def add(text):
+            text = text.strip()
+            if text:
+                text_parts.append(text)
+
+        if node.text:
+            add(node.text)
+        stack = [(iter(node), None)]
+
+        while stack:
+            children, tail = stack[-1]
+
+            for child in children:
+                if not isinstance(child.tag, str) or child.tag in _STRING_CONTAINER_TAGS:
+                    if child.tail:
+                        add(child.tail)
+                    continue
+
+                if child.text:
+                    add(child.text)
+                stack.append((iter(child), child.tail))
+                break
+            else:
+                stack.pop()
+                if tail:
+                    add(tail)
+
+        return ''.join(text_parts)
+
+BACKENDS = {
+    'html.parser': lambda: BeautifulSoupBackend('html.parser'),
+    'bs4-lxml': lambda: BeautifulSoupBackend('lxml', name='bs4-lxml'),
+    'lxml': LxmlBackend,
+}
+
+def get_backend(name=None):
+    name = name or os.getenv('PARSER_BACKEND', 'html.parser')
+
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный PARSER_BACKEND: {name} (доступны: {', '.join(BACKENDS)})")
+
+    return BACKENDS[name]()
+
+_backend_instances = {}
+
+def _cached_backend(name):
+    backend = _backend_instances.get(name)
+    if backend is None:
+        backend = _backend_instances[name] = get_backend(name)
+    return backend
+
+# точки входа для ProcessPoolExecutor: принимают сырые байты ответа и декодируют их в рабочем процессе
+
+def parse_news_items(backend_name, body, encoding='utf-8', selectors=DEFAULT_SELECTORS):
+    return _cached_backend(backend_name).extract_news_items(body.decode(encoding, errors='replace'), selectors)
+
+def parse_content(backend_name, body, encoding='utf-8', selectors=DEFAULT_SELECTORS):
+    return _cached_backend(backend_name).extract_content(body.decode(encoding, errors='replace'), selectors)
@@ -0,0 +1,209 @@
+import os
+import json
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class CacheEntry:
+    def __init__(self, url, body, encoding=None, etag=None, last_modified=None, parsed=None, parsed_by=None):
+        self.url = url
+        self.body = body
+        self.encoding = encoding or 'utf-8'
+        self.etag = etag
+        self.last_modified = last_modified
+        self.parsed = parsed
+        # чем разобрано: бэкенд и отпечаток селекторов, с другими настройками результат не годится
+        self.parsed_by = parsed_by
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache:
+    async def get(self, url):
+        return None
+
+    async def put(self, url, body, encoding=None, etag=None, last_modified=None):
+        pass
+
+    async def set_parsed(self, url, parsed, parsed_by=None):
+        pass
+
+class DiskResponseCache(ResponseCache):
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._sizes = OrderedDict()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for item in os.scandir(self.directory):
+            if not item.name.endswith('.meta'):
+                continue
+            key = item.name[:-len('.meta')]
+            try:
+                size = item.stat().st_size + os.path.getsize(self._body_path(key))
+            except OSError:
+                continue
+            entries.append((item.stat().st_mtime, key, size))
+
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self.total_bytes += size
+
+        logger.info("Кэш ответов %s: %s записей, %s байт", self.directory, len(self._sizes), self.total_bytes)
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f"{key}.meta")
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, f"{key}.body")
+
+    # файловые операции выполняются в потоках, чтобы не занимать event loop, который обслуживает и API;
+    # учёт размеров и очередь вытеснения меняются только в самом loop
+    def _read_meta(self, key):
+        with open(self._meta_path(key), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, key, meta):
+        tmp_path = f"{self._meta_path(key)}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path(key))
+
+    def _entry_size(self, key):
+        try:
+            return os.path.getsize(self._meta_path(key)) + os.path.getsize(self._body_path(key))
+        except OSError:
+            return 0
+
+    def _read_entry(self, key):
+        meta = self._read_meta(key)
+        with open(self._body_path(key), 'rb') as f:
+            body = f.read()
+        os.utime(self._meta_path(key))
+        return meta, body
+
+    def _write_entry(self, key, body, meta):
+        tmp_path = f"{self._body_path(key)}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, self._body_path(key))
+        self._write_meta(key, meta)
+        return self._entry_size(key)
+
+    def _update_parsed(self, key, parsed, parsed_by):
+        meta = self._read_meta(key)
+        meta['parsed'] = parsed
+        meta['parsed_by'] = parsed_by
+        self._write_meta(key, meta)
+        return self._entry_size(key)
+
+    def _delete_files(self, keys):
+        for key in keys:
+            for path in (self._meta_path(key), self._body_path(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    async def get(self, url):
+        key = self._key(url)
+        if key not in self._sizes:
+            return None
+
+        try:
+            meta, body = await asyncio.to_thread(self._read_entry, key)
+        except (OSError, ValueError) as e:
+            logger.error("Ошибка чтения кэша для %s: %s", url, e)
+            await self._remove([key])
+            return None
+
+        if key in self._sizes:
+            self._sizes.move_to_end(key)
+        return CacheEntry(
+            url,
+            body,
+            encoding=meta.get('encoding'),
+            etag=meta.get('etag'),
+            last_modified=meta.get('last_modified'),
+            parsed=meta.get('parsed'),
+            parsed_by=meta.get('parsed_by')
+        )
+
+    async def put(self, url, body, encoding=None, etag=None, last_modified=None):
+        key = self._key(url)
+        meta = {
+            'url': url,
+            'encoding': encoding,
+            'etag': etag,
+            'last_modified': last_modified,
+            'parsed': None,
+            'parsed_by': None
+        }
+
+        try:
+            size = await asyncio.to_thread(self._write_entry, key, body, meta)
+        except OSError as e:
+            logger.error("Ошибка записи кэша для %s: %s", url, e)
+            return
+
+        self._account(key, size)
+        await self._evict()
+
+    async def set_parsed(self, url, parsed, parsed_by=None):
+        key = self._key(url)
+        if key not in self._sizes:
+            return
+
+        try:
+            size = await asyncio.to_thread(self._update_parsed, key, parsed, parsed_by)
+        except (OSError, ValueError) as e:
+            logger.error("Ошибка записи кэша для %s: %s", url, e)
+            return
+
+        self._account(key, size)
+
+    def _account(self, key, size):
+        self.total_bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        self._sizes.move_to_end(key)
+
+    async def _remove(self, keys):
+        for key in keys:
+            self.total_bytes -= self._sizes.pop(key, 0)
+        await asyncio.to_thread(self._delete_files, keys)
+
+    async def _evict(self):
+        evicted = []
+        while self.total_bytes > self.max_bytes and len(self._sizes) > 1:
+            oldest_key = next(iter(self._sizes))
+            evicted.append(oldest_key)
+            self.total_bytes -= self._sizes.pop(oldest_key)
+
+        if evicted:
+            await asyncio.to_thread(self._delete_files, evicted)
+
+def cache_from_env():
+    directory = os.getenv('HTTP_CACHE_DIR')
+    if not directory:
+        return ResponseCache()
+
+    max_bytes = int(float(os.getenv('HTTP_CACHE_MAX_MB', '512')) * 1024 * 1024)
+    return DiskResponseCache(directory, max_bytes=max_bytes)
@@ -1,21 +1,120 @@
-import logging
+import os
 import sys
-from logging.handlers import RotatingFileHandler
+import json
+import queue
+import atexit
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# атрибуты, которые есть у любой LogRecord; всё остальное пришло через extra= и попадает в JSON
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, DATE_FORMAT),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        # предупреждения и ошибки не прореживаются
+        return self.rate >= 1.0 or record.levelno >= logging.WARNING or random.random() < self.rate
+
+class _BackgroundQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # очередь внутри процесса, поэтому форматирование откладывается до потока записи
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_handler = None
+_listener = None
+_stream_handler = None
+_loggers = {}
+
+def _parse_mapping(value):
+    mapping = {}
+    for item in (value or '').split(','):
+        name, sep, setting = item.partition('=')
+        if sep and name.strip():
+            mapping[name.strip()] = setting.strip()
+    return mapping
 
-def setup_logger(name=__name__, level=logging.INFO):
+def _start_listener():
+    global _handler, _listener, _stream_handler
+
+    log_queue = queue.Queue(int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+    _stream_handler = logging.StreamHandler(sys.stdout)
+    _handler = _BackgroundQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, _stream_handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _handler.dropped:
+            _stream_handler.stream.write(f"Отброшено записей журнала при переполнении очереди: {_handler.dropped}\n")
+            _stream_handler.flush()
+
+def configure_logging():
+    if _handler is None:
+        _start_listener()
+
+    if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+        _stream_handler.setFormatter(JsonFormatter())
+    else:
+        _stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+
+    default_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    levels = _parse_mapping(os.getenv('LOG_LEVELS'))
+    default_rate = float(os.getenv('LOG_SAMPLE_RATE', '1'))
+    rates = _parse_mapping(os.getenv('LOG_SAMPLE_RATES'))
+
+    for name, (logger, level, sampling) in _loggers.items():
+        logger.setLevel(levels.get(name, '').upper() or level or default_level)
+        sampling.rate = float(rates.get(name, default_rate))
+
+def setup_logger(name=__name__, level=None):
     logger = logging.getLogger(name)
-    logger.setLevel(level)
-
-    if logger.handlers:
-        return logger
-    
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+
+    if name not in _loggers:
+        sampling = SamplingFilter()
+        _loggers[name] = (logger, level, sampling)
+        # фильтр на самом логгере, чтобы отброшенные записи не доходили до очереди
+        logger.addFilter(sampling)
+
+    # переменные окружения могут появиться позже (load_dotenv), поэтому настройки применяются заново при каждом вызове
+    configure_logging()
+
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+
+    return logger
@@ -1,52 +1,22 @@
+import os
 import sys
+import argparse
 import asyncio
-from db_utilities import DataBaseManager
-from parser import NewsParser
+from dotenv import load_dotenv
 
 from logger_config import setup_logger
 logger = setup_logger(__name__)
 
-async def run_parser_async():
-    logger.info("Запуск парсера новостей...")
-    
-    parser = NewsParser()
-    news_dict = await parser.get_news()
-    
-    if not news_dict:
-        logger.warning("Не удалось получить новости")
-        return
-    
-    logger.info(f"Найдено {len(news_dict)} новостей для обработки")
-    
-    db_manager = DataBaseManager()
-    
-    try:
-        connection_result = await db_manager.create_connection()
-        logger.info(f"Результат создания подключения: {connection_result}")
-        
-        if connection_result:
-            inserted_count = await db_manager.insert_news(news_dict)
-            
-            if inserted_count == 0:
-                logger.info("Нет новых новостей для добавления")
-            else:
-                logger.info(f"Добавлено {inserted_count} новых новостей")
-        else:
-            logger.error("Не удалось подключиться к базе данных")
-    
-    except Exception as e:
-        logger.error(f"Ошибка при работе с базой данных: {e}")
-    finally:
-        await db_manager.close_connection()
+LEGACY_MODE_FLAGS = {'--clear': 'clear', '--backfill': 'backfill', '--export': 'export'}
 
 async def run_api_async():
     logger.info("Запуск API сервера...")
     import uvicorn
-    
+
     config = uvicorn.Config(
-        "api:app", 
-        host="0.0.0.0", 
-        port=8000, 
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
         reload=False,
         log_config=None
     )
@@ -58,7 +28,30 @@ async def run_scheduler_async():
     from scheduler import main as scheduler_main
     await scheduler_main()
 
-async def clear_database_async():
+async def serve_command(args):
+    services = []
+    # в роли worker нет API, поэтому метрики планировщика отдаются отдельным HTTP-сервером
+    if args.role == "worker" and os.getenv('METRICS_PORT'):
+        from metrics import start_metrics_server
+        start_metrics_server(int(os.getenv('METRICS_PORT')))
+
+    if args.role in ("all", "api"):
+        services.append(run_api_async())
+    if args.role in ("all", "worker"):
+        services.append(run_scheduler_async())
+
+    logger.info("Запуск в роли %s", args.role)
+    await asyncio.gather(*services, return_exceptions=True)
+
+async def crawl_command(args):
+    logger.info("Запуск разового обхода источников")
+    from pipeline import run_parser_async
+    await run_parser_async()
+
+async def clear_command(args):
+    logger.info("Запуск в режиме очистки базы данных")
+    from db_utilities import DataBaseManager
+
     db_manager = DataBaseManager()
     try:
         if await db_manager.create_connection():
@@ -71,20 +64,91 @@ async def clear_database_async():
     finally:
         await db_manager.close_connection()
 
-async def main_async():
-    if len(sys.argv) > 1 and sys.argv[1] == "--clear":
-        logger.info("Запуск в режиме очистки базы данных")
-        await clear_database_async()
-        return
-    
-    await asyncio.gather(
-        run_api_async(),
-        run_scheduler_async(),
-        return_exceptions=True
-    )
+async def backfill_command(args):
+    logger.info("Запуск в режиме загрузки архива")
+    from backfill import parse_cli_date, run_backfill_async
+
+    await run_backfill_async(parse_cli_date(args.date_from), parse_cli_date(args.date_to),
+                             update_existing=args.refresh, replay=args.replay, source=args.source)
+
+async def export_command(args):
+    logger.info("Запуск в режиме выгрузки данных")
+    from export import run_export_async
+
+    await run_export_async(args.output_dir, fmt=args.format, since=args.since, shard_size=args.shard_size)
+
+# модули режимов импортируются внутри команд: очистке и разовому обходу не нужны FastAPI и uvicorn
+COMMANDS = {
+    'serve': serve_command,
+    'crawl': crawl_command,
+    'clear': clear_command,
+    'backfill': backfill_command,
+    'export': export_command,
+}
+
+def normalize_argv(argv):
+    # старый вид запуска: режим задаётся флагом, а без флага запускается serve
+    for index, arg in enumerate(argv):
+        flag, sep, value = arg.partition('=')
+        if flag in LEGACY_MODE_FLAGS:
+            return [LEGACY_MODE_FLAGS[flag], *([value] if sep else []), *argv[:index], *argv[index + 1:]]
+
+    if argv and (argv[0] in COMMANDS or argv[0] in ('-h', '--help')):
+        return argv
+    return ['serve', *argv]
+
+def parse_args(argv=None):
+    argv = normalize_argv(sys.argv[1:] if argv is None else list(argv))
+
+    arg_parser = argparse.ArgumentParser(description="News parser and API")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="API и планировщик парсера (по умолчанию)")
+    serve.add_argument("--role", choices=("all", "api", "worker"), default=os.getenv('APP_ROLE', 'all'),
+                       help="api - только API, worker - только планировщик парсера, all - оба в одном процессе")
+
+    commands.add_parser("crawl", help="один обход источников без планировщика, например из cron")
+    commands.add_parser("clear", help="очистить базу данных")
+
+    backfill = commands.add_parser("backfill", help="загрузить архив новостей за период")
+    backfill.add_argument("date_from", metavar="FROM", help="начало периода (ГГГГ-ММ-ДД или ДД.ММ.ГГГГ)")
+    backfill.add_argument("date_to", metavar="TO", help="конец периода (ГГГГ-ММ-ДД или ДД.ММ.ГГГГ)")
+    backfill.add_argument("--source", help="источник новостей для загрузки архива (по умолчанию основной)")
+    backfill.add_argument("--refresh", action="store_true",
+                          help="обновлять заголовок и текст изменённых новостей")
+    backfill.add_argument("--replay", action="store_true",
+                          help="брать страницы только из кэша ответов (HTTP_CACHE_DIR)")
+
+    export = commands.add_parser("export", help="выгрузить таблицу news в сжатые файлы")
+    export.add_argument("output_dir", metavar="DIR", help="каталог выгрузки")
+    export.add_argument("--format", choices=("ndjson", "parquet"), default="ndjson",
+                        help="формат файлов выгрузки; parquet требует пакет pyarrow")
+    export.add_argument("--since", metavar="ISO|last",
+                        help="выгружать только новости с created_at позже указанного момента; "
+                             "last - продолжить с предыдущей выгрузки в DIR")
+    export.add_argument("--shard-size", type=int, default=100000,
+                        help="количество строк в одном файле выгрузки")
+
+    return arg_parser.parse_args(argv)
+
+async def dispose_engine_if_loaded():
+    # пул создаётся только командами, которым нужна база, и импортировать ради закрытия его не нужно
+    db_utilities = sys.modules.get('db_utilities')
+    if db_utilities is not None:
+        await db_utilities.dispose_engine()
+
+async def main_async(args=None):
+    args = args or parse_args()
+
+    try:
+        await COMMANDS[args.command](args)
+    finally:
+        await dispose_engine_if_loaded()
 
 def main():
+    # .env читается до разбора аргументов: от него зависит, например, APP_ROLE
+    load_dotenv()
     asyncio.run(main_async())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
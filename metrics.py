@@ -0,0 +1,64 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest, start_http_server
+
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    'news_stage_duration_seconds', 'Длительность стадий сбора новостей', ['stage'], buckets=LATENCY_BUCKETS
+)
+HTTP_RESPONSES = Counter('news_http_responses_total', 'Ответы источников по HTTP-статусу', ['status'])
+HTTP_DOWNLOADED_BYTES = Counter('news_http_downloaded_bytes_total', 'Скачано байт с источников')
+ARTICLES = Counter('news_articles_total', 'Результаты записи новостей в базу', ['result'])
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    'news_db_pool_checkout_seconds', 'Ожидание соединения из пула базы данных', buckets=LATENCY_BUCKETS
+)
+API_REQUEST_SECONDS = Histogram(
+    'news_api_request_duration_seconds', 'Длительность запросов к API', ['method', 'route'], buckets=LATENCY_BUCKETS
+)
+API_RESPONSES = Counter('news_api_responses_total', 'Ответы API по статусу', ['method', 'route', 'status'])
+
+# дочерние метрики с метками создаются один раз, чтобы в горячих путях не было поиска по меткам
+LISTING_FETCH_SECONDS = STAGE_SECONDS.labels('listing_fetch')
+ARTICLE_FETCH_SECONDS = STAGE_SECONDS.labels('article_fetch')
+PARSE_SECONDS = STAGE_SECONDS.labels('parse')
+DB_WRITE_SECONDS = STAGE_SECONDS.labels('db_write')
+
+ARTICLE_RESULTS = {result: ARTICLES.labels(result) for result in ('inserted', 'updated', 'skipped', 'failed', 'duplicates')}
+
+_http_status_counters = {}
+_api_route_metrics = {}
+
+def http_status_counter(status):
+    counter = _http_status_counters.get(status)
+    if counter is None:
+        counter = _http_status_counters[status] = HTTP_RESPONSES.labels(str(status))
+    return counter
+
+def api_route_metrics(method, route):
+    key = (method, route)
+    route_metrics = _api_route_metrics.get(key)
+    if route_metrics is None:
+        route_metrics = _api_route_metrics[key] = (API_REQUEST_SECONDS.labels(method, route), {})
+    return route_metrics
+
+def api_response_counter(method, route, status):
+    status_counters = api_route_metrics(method, route)[1]
+    counter = status_counters.get(status)
+    if counter is None:
+        counter = status_counters[status] = API_RESPONSES.labels(method, route, str(status))
+    return counter
+
+def record_article_counts(counts):
+    for result, counter in ARTICLE_RESULTS.items():
+        if counts.get(result):
+            counter.inc(counts[result])
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def start_metrics_server(port):
+    start_http_server(port)
+    logger.info("Метрики доступны на порту %s", port)
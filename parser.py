@@ -1,22 +1,69 @@
-from bs4 import BeautifulSoup
-import aiohttp
 from datetime import datetime, timedelta
-import re
+import os
+import time
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 
+from fetcher import AdaptiveFetcher
+from html_backends import get_backend, parse_news_items, parse_content
+from http_cache import cache_from_env
+from dedup import fingerprint, near_duplicate_distance
+from raw_html import compress_body, raw_html_codec
+from sources import PAGE_DATE_FORMAT, get_source
 from logger_config import setup_logger
+from metrics import ARTICLE_FETCH_SECONDS, LISTING_FETCH_SECONDS, PARSE_SECONDS
 logger = setup_logger(__name__)
 
+class KnownLinksCache:
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._links = OrderedDict()
+
+    def __contains__(self, link):
+        if link in self._links:
+            self._links.move_to_end(link)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._links)
+
+    def add(self, link):
+        self._links[link] = None
+        self._links.move_to_end(link)
+        if len(self._links) > self.maxsize:
+            self._links.popitem(last=False)
+
+    def update(self, links):
+        for link in links:
+            self.add(link)
+
 class NewsParser:    
-    def __init__(self, base_url='https://uralpolit.ru/news/urfo?date='):
-        self.base_url = base_url
-        self.timeout = aiohttp.ClientTimeout(total=30)
+    def __init__(self, source=None, rate_limit=None, known_links_cache_size=None,
+                 cache=None, replay=None, backend=None, parse_workers=None, fetcher=None):
+        self.source = get_source(source)
+        self.fetcher = fetcher or AdaptiveFetcher.from_env(rate_limit=rate_limit)
+        self.cache = cache if cache is not None else cache_from_env()
+        self.replay = replay if replay is not None else os.getenv('HTTP_CACHE_REPLAY', '').lower() in ('1', 'true', 'yes')
+        self.backend = get_backend(backend)
+        self.parse_workers = parse_workers if parse_workers is not None else int(os.getenv('PARSER_WORKERS', '2'))
+        self.raw_html_codec = raw_html_codec()
+        self._executor = None
+        self.known_links = KnownLinksCache(
+            known_links_cache_size or int(os.getenv('KNOWN_LINKS_CACHE_SIZE', '10000'))
+        )
 
     @staticmethod
-    def get_date_range():
-        now = datetime.now()
-        yesterday = now - timedelta(days=1)
-        return [now.strftime("%d.%m.%Y"), yesterday.strftime("%d.%m.%Y")]
+    def get_date_range(date_from=None, date_to=None):
+        if date_from is None or date_to is None:
+            now = datetime.now()
+            yesterday = now - timedelta(days=1)
+            return [now.strftime(PAGE_DATE_FORMAT), yesterday.strftime(PAGE_DATE_FORMAT)]
+
+        days = (date_to - date_from).days
+        return [(date_from + timedelta(days=i)).strftime(PAGE_DATE_FORMAT) for i in range(days + 1)]
 
     @staticmethod
     def is_within_24_hours(news_datetime):
@@ -25,177 +72,160 @@ class NewsParser:
         except Exception:
             return False
         
-    @staticmethod
-    def parse_news_datetime(news_time_str, news_date_str):
+    def _source(self, source=None):
+        return get_source(source) if source else self.source
+
+    def parse_news_datetime(self, news_time_str, news_date_str, source=None):
         try:
-            return datetime.strptime(
-                f"{news_date_str} {news_time_str}", 
-                "%d.%m.%Y %H:%M"
-            )
+            return self._source(source).parse_datetime(news_time_str, news_date_str)
         except Exception as e:
-            logger.error(f"Error parsing datetime {news_date_str} {news_time_str}: {e}")
+            logger.error("Error parsing datetime %s %s: %s", news_date_str, news_time_str, e)
             return None
 
-    async def fetch_page(self, session, date_str):
+    async def fetch_url(self, url):
+        entry = await self.cache.get(url)
+
+        if self.replay:
+            if entry is None:
+                raise LookupError(f"{url} is not in the response cache")
+            return entry.body, entry.encoding, entry
+
+        headers = entry.conditional_headers() if entry else {}
+
+        response = await self.fetcher.get(url, headers=headers)
+        if response.status == 304 and entry is not None:
+            return entry.body, entry.encoding, entry
+
+        await self.cache.put(url, response.body, response.encoding, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.body, response.encoding, None
+
+    def _get_executor(self):
+        if self.parse_workers <= 0:
+            return None
+
+        if self._executor is None:
+            # spawn, а не fork: родительский процесс уже держит потоки и открытые сокеты
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    async def _run_parse(self, func, *args):
+        executor = self._get_executor()
+        if executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    async def warm_up(self):
+        # запуск spawn-процессов занимает секунды, их лучше поднять до первого обхода
+        if self._get_executor() is not None:
+            await asyncio.gather(*(self._run_parse(parse_news_items, self.backend.name, b'') for _ in range(self.parse_workers)))
+
+    async def close(self):
+        await self.fetcher.close()
+
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            # ожидание процессов разбора не должно блокировать event loop, который в роли all обслуживает и API
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    def _parsed_by(self, source):
+        return f"{self.backend.name}:{source.selectors.fingerprint()}"
+
+    def _cached_parse(self, entry, source):
+        # в режиме replay страницы всегда разбираются заново, чтобы проверять изменения парсера
+        if entry is None or self.replay:
+            return None
+        # после смены бэкенда или селекторов сохранённый разбор устарел, хотя сама страница не менялась
+        if entry.parsed_by != self._parsed_by(source):
+            return None
+        return entry.parsed
+
+    async def fetch_news_metadata(self, date_str, only_recent=True, source=None):
+        source = self._source(source)
+        url = source.listing_url_for(date_str)
+
         try:
-            async with session.get(self.base_url + date_str, timeout=self.timeout) as response:
-                response.raise_for_status()
-                return await response.text()
+            started = time.perf_counter()
+            body, encoding, entry = await self.fetch_url(url)
+            LISTING_FETCH_SECONDS.observe(time.perf_counter() - started)
+
+            news_items = self._cached_parse(entry, source)
+            if news_items is None:
+                started = time.perf_counter()
+                news_items = await self._run_parse(parse_news_items, self.backend.name, body, encoding, source.selectors)
+                PARSE_SECONDS.observe(time.perf_counter() - started)
+                await self.cache.set_parsed(url, news_items, self._parsed_by(source))
         except Exception as e:
-            logger.error(f"Error fetching page for date {date_str}: {e}")
+            logger.error("Error fetching %s page for date %s: %s", source.name, date_str, e)
             return None
 
-    def parse_news_metadata(self, html_content, page_date):
-        if not html_content:
-            return {}
-        
-        soup = BeautifulSoup(html_content, "html.parser")
+        return self.build_news_metadata(news_items, date_str, only_recent=only_recent, source=source)
+
+    def build_news_metadata(self, news_items, page_date, only_recent=True, source=None):
+        source = self._source(source)
         news_dict = {}
         
-        news_items = soup.find_all('article', class_='news-article')
-        
         for news_item in news_items:
-            title_element = news_item.find('a', class_='news-article__title')
-            time_element = news_item.find('time')
-            
-            if title_element and time_element:
-                href = title_element.get('href')
-                news_time = time_element.get_text(strip=True)
-                
-                if ':' in news_time:
-                    time_parts = news_time.split(':')
-                    formatted_time = f"{time_parts[0]}:{time_parts[1]}" if len(time_parts) >= 2 else news_time
-                else:
-                    formatted_time = news_time
+            href = news_item['href']
+            news_time = news_item['time']
                 
-                news_datetime = self.parse_news_datetime(formatted_time, page_date)
-                
-                if news_datetime and self.is_within_24_hours(news_datetime):
-                    link = f"https://uralpolit.ru{href}" if href.startswith('/') else href
-                        
-                    news_dict[link] = {
-                        'title': title_element.get_text(strip=True),
-                        'time': news_datetime,
-                        'content': ''
-                    }
-        
-        return news_dict
-    
-    async def parse_news_content(self, session, link):
-        try:
-            async with session.get(link, timeout=self.timeout) as response:
-                response.raise_for_status()
-                html_content = await response.text()
+            if ':' in news_time:
+                time_parts = news_time.split(':')
+                formatted_time = f"{time_parts[0]}:{time_parts[1]}" if len(time_parts) >= 2 else news_time
+            else:
+                formatted_time = news_time
             
-            soup = BeautifulSoup(html_content, "html.parser")
-            
-            content_element = soup.find('div', itemprop='articleBody')
-            
-            if content_element:
-                content_parts = []
-                
-                for element in content_element.children:
-                    if element.name == 'p':
-                        paragraph_text = self._process_element_with_links(element)
-                        if paragraph_text.strip():
-                            content_parts.append(paragraph_text)
-                    elif element.name in ['div', 'span'] and element.get_text(strip=True):
-                        element_text = self._process_element_with_links(element)
-                        if element_text.strip():
-                            content_parts.append(element_text)
-                
-                content = ' '.join(content_parts)
-                content = re.sub(r'\s+', ' ', content).strip()
-                return content
-            return ""
+            news_datetime = self.parse_news_datetime(formatted_time, page_date, source=source)
             
-        except Exception as e:
-            logger.error(f"Content parsing error for {link}: {e}")
-            return ""
-    
-    def _process_element_with_links(self, element):
-        text_parts = []
+            if news_datetime and (not only_recent or self.is_within_24_hours(news_datetime)):
+                link = source.article_url(href, page_date)
+                    
+                news_dict[link] = {
+                    'title': news_item['title'],
+                    'time': news_datetime,
+                    'content': '',
+                    'source': source.name
+                }
         
-        for child in element.children:
-            if isinstance(child, str):
-                text_parts.append(child)
-            elif child.name == 'a':
-                link_text = child.get_text(strip=True)
-                if link_text:
-                    if text_parts and not text_parts[-1].endswith(' '):
-                        text_parts.append(' ')
-                    text_parts.append(link_text)
-                    text_parts.append(' ')
-            elif hasattr(child, 'get_text'):
-                nested_text = self._process_element_with_links(child)
-                if nested_text:
-                    text_parts.append(nested_text)
-        
-        result = ''.join(text_parts)
-        result = re.sub(r'\s+', ' ', result).strip()
+        return news_dict
+    
+    async def fetch_article(self, link):
+        started = time.perf_counter()
+        result = await self.fetch_url(link)
+        ARTICLE_FETCH_SECONDS.observe(time.perf_counter() - started)
         return result
 
-    # async def parse_news_content(self, session, link):
-    #     try:
-    #         async with session.get(link, timeout=self.timeout) as response:
-    #             response.raise_for_status()
-    #             html_content = await response.text()
-            
-    #         soup = BeautifulSoup(html_content, "html.parser")
-            
-    #         content_element = soup.find('div', itemprop='articleBody')
-            
-    #         if content_element:
-    #             paragraphs = content_element.find_all('p')
-    #             content = ' '.join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
-                
-    #             content = re.sub(r'\s+', ' ', content).strip()
-    #             return content
-    #         return ""
-            
-    #     except Exception as e:
-    #         logger.error(f"Content parsing error for {link}: {e}")
-    #         return ""
+    async def parse_fetched_content(self, link, body, encoding, entry=None, source=None):
+        source = self._source(source)
+        content = self._cached_parse(entry, source)
+        if content is None:
+            started = time.perf_counter()
+            content = await self._run_parse(parse_content, self.backend.name, body, encoding, source.selectors)
+            PARSE_SECONDS.observe(time.perf_counter() - started)
+            await self.cache.set_parsed(link, content, self._parsed_by(source))
 
-    
+        return content
 
-    async def enrich_news_with_content(self, session, news_dict):
-        tasks = []
-        for link, news_data in news_dict.items():
-            task = self.parse_news_content(session, link)
-            tasks.append((link, task))
-        
-        semaphore = asyncio.Semaphore(5)
-        
-        async def bounded_task(link, task):
-            async with semaphore:
-                content = await task
-                return link, content
-        
-        bounded_tasks = [bounded_task(link, task) for link, task in tasks]
-        results = await asyncio.gather(*bounded_tasks, return_exceptions=True)
-        
-        for result in results:
-            if isinstance(result, Exception):
-                logger.error(f"Error in content parsing: {result}")
-                continue
-            link, content = result
-            news_dict[link]['content'] = content
-            
-        return news_dict
+    async def fingerprint_content(self, content):
+        return await self._run_parse(fingerprint, content, near_duplicate_distance() > 0)
 
-    async def get_news(self):
-        dates_to_parse = self.get_date_range()
-        all_news = {}
-        
-        async with aiohttp.ClientSession() as session:
-            for date_str in dates_to_parse:
-                html_content = await self.fetch_page(session, date_str)
-                if html_content:
-                    news_for_date = self.parse_news_metadata(html_content, date_str)
-                    all_news.update(news_for_date)
-            
-            if all_news:
-                all_news = await self.enrich_news_with_content(session, all_news)
-        
-        return all_news
\ No newline at end of file
+    async def compress_raw_html(self, body, encoding):
+        if self.raw_html_codec is None or not body:
+            return None
+        return {
+            'compression': self.raw_html_codec,
+            'encoding': encoding,
+            'body': await self._run_parse(compress_body, body, self.raw_html_codec)
+        }
+
+    async def drop_known_links(self, news_dict, existing_links_lookup=None):
+        unknown_links = [link for link in news_dict if link not in self.known_links]
+
+        if existing_links_lookup and unknown_links:
+            self.known_links.update(await existing_links_lookup(unknown_links))
+
+        new_news = {link: data for link, data in news_dict.items() if link not in self.known_links}
+        logger.info("New articles: %s of %s", len(new_news), len(news_dict))
+        return new_news
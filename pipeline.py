@@ -0,0 +1,278 @@
+import os
+import asyncio
+
+from db_utilities import find_existing_links, store_news
+from logger_config import setup_logger
+from parser import NewsParser
+from sources import enabled_sources, get_source
+
+logger = setup_logger(__name__)
+
+# сигнал следующей стадии, что входная очередь закончилась
+_DONE = object()
+
+class NewsItem:
+    __slots__ = ('date_str', 'link', 'data', 'body', 'encoding', 'entry')
+
+    def __init__(self, date_str, link, data):
+        self.date_str = date_str
+        self.link = link
+        self.data = data
+        self.body = None
+        self.encoding = None
+        self.entry = None
+
+class DateProgress:
+    def __init__(self, on_date_done=None):
+        self.on_date_done = on_date_done
+        self._pending = {}
+        self._failed = set()
+
+    def listed(self, date_str, count):
+        self._pending[date_str] = count
+        if count == 0:
+            self._finish(date_str)
+
+    def written(self, date_strs, ok):
+        for date_str in date_strs:
+            if not ok:
+                self._failed.add(date_str)
+
+            self._pending[date_str] -= 1
+            if self._pending[date_str] == 0:
+                self._finish(date_str)
+
+    def _finish(self, date_str):
+        del self._pending[date_str]
+
+        if date_str in self._failed:
+            logger.error("Не все новости за %s сохранены, дата останется необработанной", date_str)
+            return
+
+        logger.info("Дата %s обработана", date_str)
+        if self.on_date_done is not None:
+            self.on_date_done(date_str)
+
+class IngestPipeline:
+    def __init__(self, parser, source=None, existing_links_lookup=None, update_existing=False, on_date_done=None,
+                 listing_workers=2, fetch_workers=20, parse_workers=4, queue_size=200,
+                 batch_size=100, flush_interval=5.0, store=None):
+        self.parser = parser
+        self.store = store or store_news
+        self.source = get_source(source) if source else parser.source
+        self.existing_links_lookup = existing_links_lookup
+        self.update_existing = update_existing
+        self.progress = DateProgress(on_date_done)
+        self.listing_workers = max(1, listing_workers)
+        self.fetch_workers = max(1, fetch_workers)
+        self.parse_workers = max(1, parse_workers)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.totals = {'inserted': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
+        self._seen_links = set()
+
+    @classmethod
+    def from_env(cls, parser, **kwargs):
+        options = {
+            'listing_workers': int(os.getenv('PIPELINE_LISTING_WORKERS', '2')),
+            'fetch_workers': int(os.getenv('PIPELINE_FETCH_WORKERS', '20')),
+            'parse_workers': int(os.getenv('PIPELINE_PARSE_WORKERS', '4')),
+            'queue_size': int(os.getenv('PIPELINE_QUEUE_SIZE', '200')),
+            'batch_size': int(os.getenv('PIPELINE_BATCH_SIZE', '100')),
+            'flush_interval': float(os.getenv('PIPELINE_FLUSH_INTERVAL', '5')),
+        }
+        options.update(kwargs)
+        return cls(parser, **options)
+
+    async def run(self, dates, only_recent=True):
+        date_queue = asyncio.Queue()
+        for date_str in dates:
+            date_queue.put_nowait(date_str)
+
+        # ограниченные очереди дают обратное давление: медленная запись в БД притормаживает скачивание
+        fetch_queue = asyncio.Queue(self.queue_size)
+        parse_queue = asyncio.Queue(self.queue_size)
+        write_queue = asyncio.Queue(self.queue_size)
+
+        stages = [
+            self._stage(self.listing_workers, lambda: self._listing_worker(date_queue, fetch_queue, only_recent),
+                        fetch_queue, self.fetch_workers),
+            self._stage(self.fetch_workers, lambda: self._fetch_worker(fetch_queue, parse_queue),
+                        parse_queue, self.parse_workers),
+            self._stage(self.parse_workers, lambda: self._parse_worker(parse_queue, write_queue),
+                        write_queue, 1),
+            self._writer(write_queue),
+        ]
+        await asyncio.gather(*stages)
+
+        logger.info("Конвейер %s завершён: добавлено %s, обновлено %s, пропущено %s, ошибок %s", self.source.name, self.totals['inserted'], self.totals['updated'], self.totals['skipped'], self.totals['failed'])
+        return self.totals
+
+    async def _stage(self, workers, make_worker, outbox, consumers):
+        try:
+            await asyncio.gather(*(make_worker() for _ in range(workers)))
+        finally:
+            for _ in range(consumers):
+                await outbox.put(_DONE)
+
+    async def _listing_worker(self, date_queue, fetch_queue, only_recent):
+        while True:
+            try:
+                date_str = date_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            try:
+                news_for_date = await self.parser.fetch_news_metadata(date_str, only_recent=only_recent, source=self.source)
+                if news_for_date is None:
+                    logger.warning("Страница %s за %s не загружена, дата останется необработанной", self.source.name, date_str)
+                    continue
+
+                # одна и та же статья может попасть в ленты соседних дней
+                news_for_date = {link: data for link, data in news_for_date.items() if link not in self._seen_links}
+                self._seen_links.update(news_for_date)
+
+                if news_for_date and self.existing_links_lookup:
+                    news_for_date = await self.parser.drop_known_links(news_for_date, self.existing_links_lookup)
+            except Exception as e:
+                logger.error("Ошибка получения списка новостей %s за %s: %s", self.source.name, date_str, e)
+                continue
+
+            self.progress.listed(date_str, len(news_for_date))
+            for link, data in news_for_date.items():
+                await fetch_queue.put(NewsItem(date_str, link, data))
+
+    async def _fetch_worker(self, fetch_queue, parse_queue):
+        while True:
+            item = await fetch_queue.get()
+            if item is _DONE:
+                return
+
+            try:
+                item.body, item.encoding, item.entry = await self.parser.fetch_article(item.link)
+            except Exception as e:
+                logger.error("Content parsing error for %s: %s", item.link, e)
+
+            await parse_queue.put(item)
+
+    async def _parse_worker(self, parse_queue, write_queue):
+        while True:
+            item = await parse_queue.get()
+            if item is _DONE:
+                return
+
+            parsed = False
+            if item.body is not None:
+                try:
+                    item.data['content'] = await self.parser.parse_fetched_content(
+                        item.link, item.body, item.encoding, item.entry, source=self.source
+                    )
+                    item.data.update(await self.parser.fingerprint_content(item.data['content']))
+
+                    raw_html = await self.parser.compress_raw_html(item.body, item.encoding)
+                    if raw_html:
+                        item.data['raw_html'] = raw_html
+                    parsed = True
+                except Exception as e:
+                    logger.error("Content parsing error for %s: %s", item.link, e)
+
+            # сырой ответ больше не нужен, не держим его в очереди записи
+            item.body = item.entry = None
+
+            # новость без текста не пишется: иначе дата отметится обработанной, ссылка станет известной,
+            # и текст больше никогда не будет загружен
+            if not parsed:
+                self.totals['failed'] += 1
+                self.progress.written([item.date_str], False)
+                continue
+
+            await write_queue.put(item)
+
+    async def _writer(self, write_queue):
+        loop = asyncio.get_running_loop()
+        batch = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(write_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._flush(batch)
+                batch, deadline = [], None
+                continue
+
+            if item is _DONE:
+                await self._flush(batch)
+                return
+
+            batch.append(item)
+            if deadline is None:
+                deadline = loop.time() + self.flush_interval
+
+            if len(batch) >= self.batch_size:
+                await self._flush(batch)
+                batch, deadline = [], None
+
+    async def _flush(self, batch):
+        if not batch:
+            return
+
+        news_dict = {item.link: item.data for item in batch}
+
+        try:
+            counts = await self.store(news_dict, update_existing=self.update_existing)
+        except Exception as e:
+            logger.error("Ошибка при работе с базой данных: %s", e)
+            counts = {'inserted': 0, 'updated': 0, 'skipped': 0, 'failed': len(batch)}
+
+        for key in self.totals:
+            self.totals[key] += counts[key]
+
+        ok = not counts['failed']
+        if ok:
+            self.parser.known_links.update(news_dict)
+
+        self.progress.written([item.date_str for item in batch], ok)
+
+async def crawl_sources(parser, sources, existing_links_lookup=None, only_recent=True):
+    async def crawl(source):
+        # ошибка одного источника не должна останавливать остальные
+        try:
+            pipeline = IngestPipeline.from_env(
+                parser,
+                source=source,
+                existing_links_lookup=existing_links_lookup,
+                fetch_workers=source.concurrency
+            )
+            return await pipeline.run(parser.get_date_range(), only_recent=only_recent)
+        except Exception as e:
+            logger.error("Ошибка обхода источника %s: %s", source.name, e, exc_info=True)
+            return None
+
+    results = await asyncio.gather(*(crawl(source) for source in sources))
+
+    totals = {'inserted': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
+    for counts in results:
+        for key in totals:
+            totals[key] += counts[key] if counts else 0
+    return totals
+
+async def run_parser_async(parser=None):
+    if parser is None:
+        parser = NewsParser()
+        try:
+            return await run_parser_async(parser)
+        finally:
+            await parser.close()
+
+    logger.info("Запуск парсера новостей...")
+
+    counts = await crawl_sources(parser, enabled_sources(), existing_links_lookup=find_existing_links)
+
+    if counts['inserted'] == 0:
+        logger.info("Нет новых новостей для добавления")
+    else:
+        logger.info("Добавлено %s новых новостей", counts['inserted'])
+    return counts
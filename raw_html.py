@@ -0,0 +1,31 @@
+import os
+import zlib
+
+RAW_HTML_CODECS = ('zlib', 'zstd')
+
+def raw_html_codec():
+    # по умолчанию исходный HTML не сохраняется; zstd требует пакет zstandard
+    codec = os.getenv('RAW_HTML_STORAGE', 'off').lower()
+    if codec in ('', 'off', 'false', '0', 'no'):
+        return None
+    if codec not in RAW_HTML_CODECS:
+        raise ValueError(f"Неизвестный способ сжатия HTML: {codec} (доступны: {', '.join(RAW_HTML_CODECS)})")
+    return codec
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("Для сжатия HTML в zstd нужен пакет zstandard") from e
+    return zstandard
+
+def compress_body(body, codec):
+    level = int(os.getenv('RAW_HTML_LEVEL', '6' if codec == 'zlib' else '9'))
+    if codec == 'zstd':
+        return _zstandard().ZstdCompressor(level=level).compress(body)
+    return zlib.compress(body, level)
+
+def decompress_body(data, codec):
+    if codec == 'zstd':
+        return _zstandard().ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
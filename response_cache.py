@@ -0,0 +1,60 @@
+import time
+import hashlib
+from collections import OrderedDict
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'expires_at')
+
+    def __init__(self, body, etag, expires_at):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+class ResponseLRUCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, body):
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        entry = CachedResponse(body, etag, time.monotonic() + self.ttl)
+
+        if len(body) > self.max_bytes:
+            return entry
+
+        self._remove(key)
+        self._entries[key] = entry
+        self.total_bytes += len(body)
+
+        while self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+        return entry
+
+    def invalidate(self, keys=None):
+        if keys is None:
+            self._entries.clear()
+            self.total_bytes = 0
+            return
+
+        for key in keys:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry.body)
@@ -1,51 +1,89 @@
+import os
+import time
+import random
 import asyncio
 from datetime import datetime
-from main import run_parser_async
+from db_utilities import AdvisoryLock
+from parser import NewsParser
+from pipeline import run_parser_async
 from logger_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# ключ pg_advisory_lock, по которому реплики выбирают ведущую для обхода источников
+CRAWLER_LOCK_KEY = 0x6E657773
+
 class AsyncScheduler:
-    def __init__(self):
+    def __init__(self, interval=None, jitter=None, run_on_start=None, lock_key=None):
+        self.interval = interval or float(os.getenv('SCHEDULER_INTERVAL', '3600'))
+        self.jitter = jitter if jitter is not None else float(os.getenv('SCHEDULER_JITTER', '60'))
+        self.run_on_start = run_on_start if run_on_start is not None else (
+            os.getenv('SCHEDULER_RUN_ON_START', 'true').lower() in ('1', 'true', 'yes')
+        )
+        self.lock = AdvisoryLock(lock_key or int(os.getenv('SCHEDULER_LOCK_KEY', str(CRAWLER_LOCK_KEY))))
         self.is_running = False
         self.task = None
+        self.parser = NewsParser()
+
+    def next_run_delay(self, now=None):
+        now = time.time() if now is None else now
+        # запуски привязаны к границам интервала по часам, поэтому длительность обхода не сдвигает расписание
+        next_boundary = (now // self.interval + 1) * self.interval
+        return next_boundary - now + random.uniform(0, self.jitter)
 
     async def run_scheduled_parser(self):
         try:
             logger.info("=== Запуск парсера по расписанию ===")
             start_time = datetime.now()
-            
-            await run_parser_async()
-            
+
+            await run_parser_async(self.parser)
+
             end_time = datetime.now()
             duration = (end_time - start_time).total_seconds()
-            logger.info(f"Парсер завершил работу за {duration:.2f} секунд")
-            
+            logger.info("Парсер завершил работу за %.2f секунд", duration)
+
         except Exception as e:
-            logger.error(f"Ошибка при выполнении парсера: {e}", exc_info=True)
+            logger.error("Ошибка при выполнении парсера: %s", e, exc_info=True)
+
+    async def tick(self):
+        if self.task is not None and not self.task.done():
+            logger.warning("Предыдущий запуск парсера ещё не завершён, запуск пропущен")
+            return
+
+        if not await self.lock.acquire():
+            logger.info("Парсер запущен в другой реплике, запуск пропущен")
+            return
+
+        self.task = asyncio.create_task(self.run_scheduled_parser())
 
     async def start_scheduler(self):
         self.is_running = True
-        logger.info("Асинхронный планировщик запущен")
-        
+        logger.info("Асинхронный планировщик запущен: интервал %.0f с, разброс до %.0f с", self.interval, self.jitter)
+
+        if self.run_on_start:
+            await self.tick()
+
         while self.is_running:
-            await self.run_scheduled_parser()
-            await asyncio.sleep(3600)
+            delay = self.next_run_delay()
+            logger.info("Следующий запуск парсера через %.0f с", delay)
+            await asyncio.sleep(delay)
+            await self.tick()
 
     async def stop_scheduler(self):
         self.is_running = False
         if self.task:
             self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        await self.lock.release()
+        await self.parser.close()
         logger.info("Планировщик остановлен")
 
 async def main():
     scheduler = AsyncScheduler()
-    
+
     try:
-        await scheduler.run_scheduled_parser()
         await scheduler.start_scheduler()
-    except KeyboardInterrupt:
-        await scheduler.stop_scheduler()
     except Exception as e:
-        logger.error(f"Ошибка в планировщике: {e}", exc_info=True)
-        await scheduler.stop_scheduler()
\ No newline at end of file
+        logger.error("Ошибка в планировщике: %s", e, exc_info=True)
+    finally:
+        await scheduler.stop_scheduler()
@@ -0,0 +1,101 @@
+import os
+import json
+from datetime import datetime
+from urllib.parse import urljoin
+
+from dedup import canonicalize_url
+from html_backends import DEFAULT_SELECTORS, Selector, SourceSelectors
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# даты внутри парсера и в checkpoint всегда в этом формате, формат сайта задаёт источник
+PAGE_DATE_FORMAT = "%d.%m.%Y"
+
+class NewsSource:
+    def __init__(self, name, listing_url, selectors=DEFAULT_SELECTORS, date_format=PAGE_DATE_FORMAT,
+                 time_format="%H:%M", concurrency=5):
+        self.name = name
+        self.listing_url = listing_url
+        self.selectors = selectors
+        self.date_format = date_format
+        self.time_format = time_format
+        self.concurrency = concurrency
+
+    def listing_url_for(self, date_str):
+        page_date = datetime.strptime(date_str, PAGE_DATE_FORMAT)
+        return self.listing_url.format(date=page_date.strftime(self.date_format))
+
+    def article_url(self, href, date_str):
+        return canonicalize_url(urljoin(self.listing_url_for(date_str), href))
+
+    def parse_datetime(self, news_time_str, date_str):
+        return datetime.strptime(f"{date_str} {news_time_str}", f"{PAGE_DATE_FORMAT} {self.time_format}")
+
+    @classmethod
+    def from_dict(cls, config):
+        selectors = config.get('selectors')
+        if selectors:
+            selectors = SourceSelectors(**{
+                key: Selector(*value) if isinstance(value, (list, tuple)) else Selector(value)
+                for key, value in selectors.items()
+            })
+
+        return cls(
+            config['name'],
+            config['listing_url'],
+            selectors=selectors or DEFAULT_SELECTORS,
+            date_format=config.get('date_format', PAGE_DATE_FORMAT),
+            time_format=config.get('time_format', "%H:%M"),
+            concurrency=int(config.get('concurrency', 5))
+        )
+
+SOURCES = {}
+
+def register_source(source):
+    if source.name in SOURCES:
+        logger.warning("Источник %s уже зарегистрирован и будет заменён", source.name)
+    SOURCES[source.name] = source
+    return source
+
+register_source(NewsSource('uralpolit', 'https://uralpolit.ru/news/urfo?date={date}'))
+
+DEFAULT_SOURCE = 'uralpolit'
+
+def load_sources_file(path):
+    with open(path, encoding='utf-8') as f:
+        configs = json.load(f)
+
+    for config in configs:
+        register_source(NewsSource.from_dict(config))
+
+    logger.info("Загружено источников из %s: %s", path, len(configs))
+
+_sources_file_loaded = False
+
+def _load_sources_from_env():
+    global _sources_file_loaded
+    if _sources_file_loaded:
+        return
+
+    _sources_file_loaded = True
+    path = os.getenv('NEWS_SOURCES_FILE')
+    if path:
+        load_sources_file(path)
+
+def get_source(source=None):
+    if isinstance(source, NewsSource):
+        return source
+
+    _load_sources_from_env()
+    name = source or DEFAULT_SOURCE
+
+    if name not in SOURCES:
+        raise ValueError(f"Неизвестный источник новостей: {name} (доступны: {', '.join(SOURCES)})")
+
+    return SOURCES[name]
+
+def enabled_sources():
+    _load_sources_from_env()
+    names = [name.strip() for name in os.getenv('NEWS_SOURCES', '').split(',') if name.strip()]
+    return [get_source(name) for name in names] if names else list(SOURCES.values())
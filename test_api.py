@@ -0,0 +1,105 @@
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from api import app, get_db_opener, news_cache
+from metrics import api_response_counter, api_route_metrics
+
+NEWS = SimpleNamespace(
+    id=1, title='Новость', time=datetime(2024, 5, 1, 9, 15), link='http://example.com/news/1',
+    content='Текст', created_at=datetime(2024, 5, 1, 9, 20), source='uralpolit', duplicate_of=None
+)
+
+class StubDatabase:
+    def __init__(self, rows=(), available=True):
+        self.rows = {row.id: row for row in rows}
+        self.available = available
+        self.opened = 0
+        self.closed = 0
+
+    @asynccontextmanager
+    async def open(self):
+        self.opened += 1
+        if not self.available:
+            raise HTTPException(status_code=500, detail="Database connection failed")
+        try:
+            yield self
+        finally:
+            self.closed += 1
+
+    async def get_news_by_id(self, news_id):
+        return self.rows.get(news_id)
+
+    async def stream_news(self, since=None, fields=None):
+        for row in self.rows.values():
+            yield row
+
+@pytest.fixture
+def client():
+    news_cache.invalidate([NEWS.id])
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    news_cache.invalidate([NEWS.id])
+
+def use_database(database):
+    app.dependency_overrides[get_db_opener] = lambda: database.open
+
+def test_cache_hit_and_304_do_not_touch_database(client):
+    use_database(StubDatabase([NEWS]))
+    first = client.get('/news/1')
+    assert first.status_code == 200
+    assert first.json()['title'] == 'Новость'
+
+    database_down = StubDatabase(available=False)
+    use_database(database_down)
+
+    cached = client.get('/news/1')
+    assert cached.status_code == 200
+    assert cached.content == first.content
+
+    not_modified = client.get('/news/1', headers={'If-None-Match': first.headers['ETag']})
+    assert not_modified.status_code == 304
+    assert database_down.opened == 0
+
+def test_cache_miss_opens_database(client):
+    database_down = StubDatabase(available=False)
+    use_database(database_down)
+
+    assert client.get('/news/1').status_code == 500
+    assert database_down.opened == 1
+
+def test_missing_news_is_404(client):
+    use_database(StubDatabase())
+    assert client.get('/news/1').status_code == 404
+
+def test_export_streams_rows_and_closes_session(client):
+    database = StubDatabase([NEWS])
+    use_database(database)
+
+    response = client.get('/news/export', params={'fields': 'id,title'})
+    assert response.status_code == 200
+    assert response.json() == {'id': 1, 'title': 'Новость'}
+    assert database.closed == 1
+
+def test_export_with_database_down_is_500(client):
+    use_database(StubDatabase(available=False))
+
+    for export_format in ('ndjson', 'csv'):
+        assert client.get('/news/export', params={'format': export_format}).status_code == 500
+
+def test_request_metrics_use_route_template(client):
+    use_database(StubDatabase([NEWS]))
+    before = api_response_counter('GET', '/news/{news_id}', 200)._value.get()
+    export_before = api_route_metrics('GET', '/news/export')[0]._sum.get()
+
+    client.get('/news/1')
+    client.get('/news/export')
+
+    assert api_response_counter('GET', '/news/{news_id}', 200)._value.get() == before + 1
+    assert api_route_metrics('GET', '/news/export')[0]._sum.get() > export_before
+    assert client.get('/no/such/path').status_code == 404
+    assert api_response_counter('GET', 'unmatched', 404)._value.get() >= 1
@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from db_utilities import DataBaseManager
+from dedup import DuplicateIndex, canonicalize_url, fingerprint, hamming_distance
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTP://Example.COM:80/news/1?utm_source=tg&id=5&fbclid=x', 'http://example.com/news/1?id=5'),
+    ('https://example.com:443/a?b=2&a=1&utm_medium=rss', 'https://example.com/a?a=1&b=2'),
+    ('https://example.com:8443/a#comments', 'https://example.com:8443/a'),
+    ('  https://example.com?yclid=1  ', 'https://example.com/'),
+    ('https://example.com/a?empty=', 'https://example.com/a?empty='),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+def test_find_exact_hash_skips_same_link():
+    index = DuplicateIndex()
+    index.add(1, '/original', 'hash')
+
+    assert index.find('/repost', 'hash') == 1
+    assert index.find('/original', 'hash') is None
+    assert index.find('/repost', 'other') is None
+    assert index.find('/repost', None) is None
+
+def flip_bits(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    # как в simhash: знаковое 64-битное значение
+    value &= (1 << 64) - 1
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def test_find_simhash_within_max_distance():
+    base = -0x1234_5678_9abc_def0
+    index = DuplicateIndex(max_distance=3)
+    index.add(1, '/original', None, base)
+
+    # отличия разнесены по разным полосам, совпадает только одна
+    near = flip_bits(base, (0, 17, 40))
+    far = flip_bits(base, (0, 17, 40, 60))
+    assert hamming_distance(base, near) == 3
+
+    assert index.find('/repost', None, near) == 1
+    assert index.find('/repost', None, far) is None
+    assert index.find('/original', None, near) is None
+
+def test_simhash_ignored_when_disabled():
+    index = DuplicateIndex(max_distance=0)
+    index.add(1, '/original', None, 42)
+    assert index.find('/repost', None, 42) is None
+
+def test_fingerprint_skips_short_text(monkeypatch):
+    monkeypatch.setenv('DEDUP_MIN_WORDS', '3')
+    assert fingerprint('два слова') == {'content_hash': None, 'simhash': None}
+    assert fingerprint('Раз, два  три!')['content_hash'] == fingerprint('раз два три')['content_hash']
+
+class RecordingSession:
+    def __init__(self):
+        self.batches = []
+        self.next_id = 100
+
+    async def execute(self, rows):
+        self.batches.append([dict(row) for row in rows])
+        returned = []
+        for row in rows:
+            self.next_id += 1
+            returned.append(SimpleNamespace(id=self.next_id, link=row['link'], inserted=True))
+        return SimpleNamespace(all=lambda: returned)
+
+class ChunkWriter(DataBaseManager):
+    # запрос не строится, в сессию уходят сами строки пачки
+    @staticmethod
+    def _build_upsert(rows, update_existing):
+        return rows
+
+def news_row(link, content_hash):
+    return {'link': link, 'content': f'текст {link}', 'content_hash': content_hash, 'simhash': None, 'duplicate_of': None}
+
+def test_write_chunk_defers_duplicate_of_row_in_same_chunk():
+    writer = ChunkWriter()
+    writer.session = RecordingSession()
+    chunk = [news_row('/a', 'same'), news_row('/b', 'other'), news_row('/c', 'same')]
+
+    returned, duplicates = asyncio.run(writer._write_chunk(chunk, False, DuplicateIndex()))
+
+    first_batch, second_batch = writer.session.batches
+    assert [row['link'] for row in first_batch] == ['/a', '/b']
+    assert [row['link'] for row in second_batch] == ['/c']
+
+    original_id = next(row.id for row in returned if row.link == '/a')
+    assert second_batch[0]['duplicate_of'] == original_id
+    assert second_batch[0]['content'] is None
+    assert duplicates == 1
+    assert len(returned) == 3
+
+def test_write_chunk_links_to_existing_original():
+    writer = ChunkWriter()
+    writer.session = RecordingSession()
+    index = DuplicateIndex()
+    index.add(7, '/old', 'same')
+
+    returned, duplicates = asyncio.run(writer._write_chunk([news_row('/new', 'same')], False, index))
+
+    assert len(writer.session.batches) == 1
+    assert writer.session.batches[0][0]['duplicate_of'] == 7
+    assert duplicates == 1
@@ -0,0 +1,71 @@
+import gzip
+import json
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import export
+
+START = datetime(2024, 5, 1, 12, 0)
+
+def news(news_id, seconds):
+    return SimpleNamespace(
+        id=news_id, title=f'Новость {news_id}', time=START, link=f'http://example.com/{news_id}',
+        content='', created_at=START + timedelta(seconds=seconds), source='uralpolit', duplicate_of=None
+    )
+
+class StubDatabase:
+    rows = []
+
+    async def create_connection(self):
+        return True
+
+    async def close_connection(self):
+        pass
+
+    async def stream_news(self, since=None, fields=None):
+        for row in sorted(self.rows, key=lambda row: (row.created_at, row.id)):
+            if since is None or row.created_at > since:
+                yield row
+
+@pytest.fixture
+def database(monkeypatch):
+    monkeypatch.setattr(export, 'DataBaseManager', StubDatabase)
+    monkeypatch.setenv('EXPORT_OVERLAP_SECONDS', '60')
+    StubDatabase.rows = []
+    return StubDatabase.rows
+
+def exported_ids(output_dir, manifest):
+    ids = []
+    for shard in manifest['shards']:
+        with gzip.open(output_dir / shard, 'rt', encoding='utf-8') as f:
+            ids.extend(json.loads(line)['id'] for line in f)
+    return ids
+
+def run_export(output_dir, since):
+    manifest = asyncio.run(export.run_export_async(str(output_dir), fmt='ndjson', since=since))
+    return exported_ids(output_dir, manifest), manifest
+
+def test_incremental_export_picks_up_late_commits_once(database, tmp_path):
+    database.extend([news(1, 0), news(2, 10)])
+    ids, manifest = run_export(tmp_path, None)
+    assert ids == [1, 2]
+    assert manifest['overlap_ids'] == [1, 2]
+
+    # строка с меньшим created_at зафиксирована после выгрузки
+    database.extend([news(3, 5), news(4, 200)])
+    ids, manifest = run_export(tmp_path, 'last')
+    assert ids == [3, 4]
+    assert manifest['max_created_at'] == (START + timedelta(seconds=200)).isoformat()
+    assert manifest['overlap_ids'] == [4]
+
+    ids, manifest = run_export(tmp_path, 'last')
+    assert ids == []
+    assert manifest['overlap_ids'] == [4]
+
+def test_explicit_since_has_no_overlap(tmp_path):
+    since, skip_ids = export.resolve_since(str(tmp_path), '2024-05-01T12:00:05')
+    assert since == START + timedelta(seconds=5)
+    assert skip_ids == set()
@@ -0,0 +1,174 @@
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from aiohttp import web
+
+from fetcher import AdaptiveFetcher, AdaptiveLimiter, FetchError
+
+class StandInServer:
+    def __init__(self, responses):
+        # путь -> список ответов по порядку, последний повторяется
+        self.responses = responses
+        self.hits = {}
+        self.peers = set()
+
+    async def handle(self, request):
+        path = request.path
+        self.hits[path] = self.hits.get(path, 0) + 1
+        self.peers.add(request.transport.get_extra_info('peername'))
+
+        planned = self.responses[path]
+        status, headers = planned[min(self.hits[path], len(planned)) - 1]
+        return web.Response(status=status, headers=headers(), text=f"{path} {status}")
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.base_url = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.runner.cleanup()
+
+def ok():
+    return {}
+
+def run_with_server(responses, scenario, **fetcher_options):
+    async def main():
+        fetcher = AdaptiveFetcher(**fetcher_options)
+        try:
+            async with StandInServer(responses) as server:
+                return await scenario(fetcher, server)
+        finally:
+            await fetcher.close()
+
+    return asyncio.run(main())
+
+def test_429_retry_after_seconds():
+    async def scenario(fetcher, server):
+        started = time.monotonic()
+        result = await fetcher.get(f"{server.base_url}/limited")
+        return result, time.monotonic() - started, server.hits['/limited']
+
+    result, elapsed, hits = run_with_server(
+        {'/limited': [(429, lambda: {'Retry-After': '1'}), (200, ok)]},
+        scenario, backoff_base=0, backoff_max=0.3
+    )
+
+    assert result.status == 200
+    assert hits == 2
+    # ожидание задаёт Retry-After целиком, backoff_max ограничивает только экспоненциальный backoff
+    assert elapsed >= 0.95
+
+def test_429_retry_after_too_long_fails_without_retry():
+    async def scenario(fetcher, server):
+        started = time.monotonic()
+        with pytest.raises(FetchError) as error:
+            await fetcher.get(f"{server.base_url}/limited")
+        limiter = fetcher._get_host(server.base_url)
+        paused_for = limiter.paused_until - asyncio.get_running_loop().time()
+        return error.value, time.monotonic() - started, server.hits['/limited'], paused_for
+
+    error, elapsed, hits, paused_for = run_with_server(
+        {'/limited': [(429, lambda: {'Retry-After': '120'})]},
+        scenario, backoff_base=0, retry_after_max=5
+    )
+
+    assert error.status == 429
+    assert hits == 1
+    assert elapsed < 1
+    # хост остаётся на паузе весь срок Retry-After
+    assert paused_for > 100
+
+def test_429_retry_after_http_date():
+    def retry_at():
+        return {'Retry-After': format_datetime(datetime.now(timezone.utc) + timedelta(seconds=2), usegmt=True)}
+
+    async def scenario(fetcher, server):
+        started = time.monotonic()
+        result = await fetcher.get(f"{server.base_url}/limited")
+        return result, time.monotonic() - started, server.hits['/limited']
+
+    result, elapsed, hits = run_with_server(
+        {'/limited': [(429, retry_at), (200, ok)]},
+        scenario, backoff_base=0
+    )
+
+    assert result.status == 200
+    assert hits == 2
+    # дата в заголовке с точностью до секунды, поэтому ждём не меньше секунды
+    assert elapsed >= 0.9
+
+def test_503_succeeds_on_retry():
+    async def scenario(fetcher, server):
+        result = await fetcher.get(f"{server.base_url}/flaky")
+        return result, server.hits['/flaky']
+
+    result, hits = run_with_server(
+        {'/flaky': [(503, ok), (503, ok), (200, ok)]},
+        scenario, backoff_base=0.01, max_retries=3
+    )
+
+    assert result.status == 200
+    assert result.body == b'/flaky 200'
+    assert hits == 3
+
+def test_retries_exhausted():
+    async def scenario(fetcher, server):
+        with pytest.raises(FetchError) as error:
+            await fetcher.get(f"{server.base_url}/down")
+        return error.value, server.hits['/down']
+
+    error, hits = run_with_server({'/down': [(503, ok)]}, scenario, backoff_base=0.01, max_retries=2)
+
+    assert error.status == 503
+    assert hits == 3
+
+def test_limit_shrinks_on_overload_and_grows_after_fast_successes():
+    async def scenario(fetcher, server):
+        limiter = fetcher._get_host(server.base_url)
+
+        with pytest.raises(FetchError):
+            await fetcher.get(f"{server.base_url}/overload")
+        shrunk = limiter.limit
+
+        for _ in range(int(shrunk)):
+            await fetcher.get(f"{server.base_url}/fast")
+        return shrunk, limiter.limit
+
+    shrunk, grown = run_with_server(
+        {'/overload': [(503, ok)], '/fast': [(200, ok)]},
+        scenario, initial_concurrency=8, max_concurrency=10, max_retries=0
+    )
+
+    assert shrunk == 4
+    assert grown == 5
+
+def test_limiter_ignores_repeated_overload_within_window():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=8, target_latency=60)
+        limiter.on_overload()
+        limiter.on_overload()
+        return limiter.limit
+
+    assert asyncio.run(scenario()) == 4
+
+def test_session_reused_across_requests():
+    async def scenario(fetcher, server):
+        await fetcher.get(f"{server.base_url}/first")
+        session = fetcher._session
+        await fetcher.get(f"{server.base_url}/second")
+        return session, fetcher._session, server.peers
+
+    first_session, second_session, peers = run_with_server({'/first': [(200, ok)], '/second': [(200, ok)]}, scenario)
+
+    assert first_session is second_session
+    # keep-alive: оба запроса прошли по одному TCP-соединению
+    assert len(peers) == 1
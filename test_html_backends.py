@@ -0,0 +1,95 @@
+import pytest
+
+from html_backends import BACKENDS, DEFAULT_SELECTORS, Selector, SourceSelectors, get_backend, parse_content
+
+LISTING = (
+    '<html><body><div class="news-list">'
+    '<article class="news-article"><a class="news-article__title" href="/news/1">Первая  новость</a>'
+    '<time>09:15</time></article>'
+    '<article class="news-article big"><a class="x news-article__title" href="/n/2"> Title <b>bold</b> </a>'
+    '<time> 12:30:00 </time></article>'
+    '<article class="news-article"><a href="/n/3">без класса заголовка</a><time>1</time></article>'
+    '<article class="other"><a class="news-article__title" href="/n/4">t</a><time>1</time></article>'
+    '</div></body></html>'
+)
+
+LISTING_ITEMS = [
+    {'href': '/news/1', 'title': 'Первая  новость', 'time': '09:15'},
+    {'href': '/n/2', 'title': 'Titlebold', 'time': '12:30:00'},
+]
+
+# (разметка, ожидаемый текст) - одинаковый результат для всех бэкендов
+CONTENT_CASES = [
+    (
+        '<div itemprop="articleBody">\n  <p>Hello <a href="#">world</a>!</p>\n'
+        '<p>A<b>B</b><a>C</a>D<i> E </i><a> </a>F</p>\n</div>',
+        'Hello world ! AB C DEF'
+    ),
+    (
+        '<div itemprop="articleBody"><p><strong>Жирный</strong>текст<a href="x"><span>в</span> <em>ссылке</em></a>'
+        'после</p><div><script>var a=1;</script>видимый</div><div><script>only script</script></div>'
+        '<span>  </span><p>x<!--comment-->y</p></div>',
+        'Жирныйтекст вссылке после var a=1;видимый xcommenty'
+    ),
+    (
+        '<div itemprop="articleBody"><p>Tab\there\r\nnewline&nbsp;nbsp <a>l1</a><a>l2</a> <a>l3</a>end</p>'
+        '<div><p>nested p <a>link<script>x</script>after</a></p></div><blockquote>skip me</blockquote>'
+        '<span>span <b>text</b></span></div>',
+        'Tab here newline nbsp l1 l2 l3 end nested p linkafter span text'
+    ),
+    (
+        '<html><head><meta charset="utf-8"></head><body><div class="x"><div itemprop="articleBody">'
+        '<p>Только  <a href="/a">ссылка</a></p><p><img src="x"><br>после br</p>'
+        '<div><template><a>tpl</a> ttt</template>vis</div><p><ruby>漢<rt>kan</rt></ruby> ok</p>'
+        '</div></div></body></html>',
+        'Только ссылка после br tttvis 漢kan ok'
+    ),
+    ('<div itemprop="articleBody">no children tags</div>', ''),
+    ('<div>no body</div>', ''),
+]
+
+# Некорректная разметка, на которой бэкенды расходятся: html.parser не закрывает незакрытые теги
+# и вкладывает элементы друг в друга, а libxml2 (lxml и bs4-lxml) закрывает их по правилам HTML.
+DIVERGENT_CONTENT_CASES = [
+    (
+        '<div itemprop="articleBody"><p>a<a href=x>link<a>inner</a></a>b</p></div>',
+        {'html.parser': 'a linkinner b', 'bs4-lxml': 'a link inner b', 'lxml': 'a link inner b'}
+    ),
+    (
+        '<div itemprop="articleBody"><p>unclosed <b>bold<p>next',
+        {'html.parser': 'unclosed boldnext', 'bs4-lxml': 'unclosed bold next', 'lxml': 'unclosed bold next'}
+    ),
+]
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request):
+    return get_backend(request.param)
+
+def test_news_items(backend):
+    assert backend.extract_news_items(LISTING) == LISTING_ITEMS
+
+@pytest.mark.parametrize('html, expected', CONTENT_CASES)
+def test_content(backend, html, expected):
+    assert backend.extract_content(html) == expected
+
+@pytest.mark.parametrize('html, expected', DIVERGENT_CONTENT_CASES)
+def test_divergent_content(backend, html, expected):
+    assert backend.extract_content(html) == expected[backend.name]
+
+def test_custom_selectors(backend):
+    selectors = SourceSelectors(
+        item=Selector('li', 'class', 'item'),
+        title=Selector('a', 'class', 'title'),
+        time=Selector('span', 'class', 'when'),
+        content=Selector('section', 'class', 'text')
+    )
+    listing = '<ul><li class="item"><h2><a class="title" href="/a">Заголовок</a></h2><span class="when">10:00</span></li></ul>'
+    article = '<section class="text"><p>Первый</p><p>второй</p></section>'
+
+    assert backend.extract_news_items(listing, selectors) == [{'href': '/a', 'title': 'Заголовок', 'time': '10:00'}]
+    assert backend.extract_content(article, selectors) == 'Первый второй'
+
+@pytest.mark.parametrize('name', list(BACKENDS))
+def test_parse_content_decodes_body(name):
+    body = '<div itemprop="articleBody"><p>Новость в cp1251</p></div>'.encode('cp1251')
+    assert parse_content(name, body, 'cp1251', DEFAULT_SELECTORS) == 'Новость в cp1251'
@@ -0,0 +1,55 @@
+import asyncio
+
+from html_backends import DEFAULT_SELECTORS, Selector, SourceSelectors
+from http_cache import DiskResponseCache
+from parser import NewsParser
+
+ARTICLE_URL = 'http://example.com/news/1'
+ARTICLE = '<div itemprop="articleBody"><p>Свежий текст</p></div>'.encode('utf-8')
+
+def make_parser(cache, backend):
+    return NewsParser(cache=cache, backend=backend, parse_workers=0, fetcher=object(), replay=False)
+
+def test_disk_cache_keeps_parsed_by(tmp_path):
+    async def scenario():
+        cache = DiskResponseCache(str(tmp_path))
+        await cache.put(ARTICLE_URL, ARTICLE, 'utf-8', '"v1"', None)
+        await cache.set_parsed(ARTICLE_URL, 'разбор', 'lxml:abc')
+        return await DiskResponseCache(str(tmp_path)).get(ARTICLE_URL)
+
+    entry = asyncio.run(scenario())
+    assert entry.body == ARTICLE
+    assert (entry.parsed, entry.parsed_by) == ('разбор', 'lxml:abc')
+
+def test_parsed_result_reused_only_with_same_backend_and_selectors(tmp_path):
+    async def parse_with(backend):
+        cache = DiskResponseCache(str(tmp_path))
+        entry = await cache.get(ARTICLE_URL)
+        return await make_parser(cache, backend).parse_fetched_content(ARTICLE_URL, ARTICLE, 'utf-8', entry)
+
+    async def scenario():
+        cache = DiskResponseCache(str(tmp_path))
+        await cache.put(ARTICLE_URL, ARTICLE, 'utf-8', '"v1"', None)
+        parser = make_parser(cache, 'lxml')
+        await cache.set_parsed(ARTICLE_URL, 'старый разбор', parser._parsed_by(parser.source))
+
+        same = await parse_with('lxml')
+        other_backend = await parse_with('html.parser')
+        # повторный разбор сохранён с ключом нового бэкенда
+        again = await parse_with('html.parser')
+        return same, other_backend, again
+
+    same, other_backend, again = asyncio.run(scenario())
+    assert same == 'старый разбор'
+    assert other_backend == 'Свежий текст'
+    assert again == 'Свежий текст'
+
+def test_selectors_fingerprint_changes_with_selectors():
+    changed = SourceSelectors(
+        item=DEFAULT_SELECTORS.item,
+        title=DEFAULT_SELECTORS.title,
+        time=DEFAULT_SELECTORS.time,
+        content=Selector('section', 'class', 'text')
+    )
+    assert DEFAULT_SELECTORS.fingerprint() == DEFAULT_SELECTORS.fingerprint()
+    assert changed.fingerprint() != DEFAULT_SELECTORS.fingerprint()
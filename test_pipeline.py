@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+from pipeline import IngestPipeline
+
+class StubParser:
+    def __init__(self, listings, broken_links=()):
+        self.source = SimpleNamespace(name='stub')
+        self.listings = listings
+        self.broken_links = set(broken_links)
+        self.known_links = {}
+
+    async def fetch_news_metadata(self, date_str, only_recent=True, source=None):
+        return {link: {'title': link, 'source': 'stub'} for link in self.listings[date_str]}
+
+    async def fetch_article(self, link):
+        if link in self.broken_links:
+            raise RuntimeError("connection reset")
+        return f'<p>{link}</p>'.encode(), 'utf-8', None
+
+    async def parse_fetched_content(self, link, body, encoding, entry, source=None):
+        return body.decode(encoding)
+
+    async def fingerprint_content(self, content):
+        return {}
+
+    async def compress_raw_html(self, body, encoding):
+        return None
+
+def run_pipeline(parser):
+    written = {}
+    done_dates = []
+
+    async def store(news_dict, update_existing=False):
+        written.update(news_dict)
+        return {'inserted': len(news_dict), 'updated': 0, 'skipped': 0, 'failed': 0}
+
+    pipeline = IngestPipeline(parser, store=store, on_date_done=done_dates.append, flush_interval=0.01)
+    totals = asyncio.run(pipeline.run(list(parser.listings)))
+    return totals, written, done_dates
+
+def test_failed_fetch_is_not_written_and_date_not_checkpointed():
+    parser = StubParser({'01.05.2024': ['/a', '/b'], '02.05.2024': ['/c']}, broken_links=['/b'])
+
+    totals, written, done_dates = run_pipeline(parser)
+
+    assert sorted(written) == ['/a', '/c']
+    assert written['/a']['content'] == '<p>/a</p>'
+    assert '/b' not in parser.known_links
+    assert done_dates == ['02.05.2024']
+    assert totals['inserted'] == 2
+    assert totals['failed'] == 1